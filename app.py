@@ -1,26 +1,160 @@
+import time
+startup_start = time.perf_counter()  # ✅ Start of the cold-start timing report
 import dash
 dash._dash_renderer._set_react_version("18.2.0")  # Forces Dash to use React 18
-from dash import dcc, html, Input, Output, callback
+from dash import dcc, html, Input, Output, State, ClientsideFunction, callback, ctx, no_update
 # import dash_table
 from dash_ag_grid import AgGrid
 from dash.dependencies import Input, Output
-import plotly.express as px
 import pandas as pd
-# import numpy as np
+import numpy as np
+import importlib
+import json
+import os
+import threading
+from collections import namedtuple
+from flask import Response, jsonify, request, abort, send_file
 import config  # Import paths & configs
-from utils.cache import cache  # Import cache system
+from utils.cache import cache, FigureCache, digest  # Import cache system
+from utils import grid  # Server-side row model for the compare grid
+from utils.snapshots import TableSnapshots, file_digest
+from utils.index import DistrictCatalog, DistrictIndex
+from utils.compact import compact_frame, memory_report
+from utils.datastore import DataStore, DIMENSION_COLUMNS, read_arrow
+from utils.arraystore import ArrayStore
+from utils.metadata import build_metadata, read_metadata
+from utils.cubes import CUBE_LEVELS, CUBE_MEASURES, build_cube, read_cube, roll_up
+from utils import metrics  # Per-callback latency/payload/rows/cache instrumentation
+from utils.singleflight import singleflight  # Concurrent identical computations share one run
+from utils.topology import read_geometry_index
+from utils.export import EXPORT_FORMATS, export_chunks, frame_batches, frame_schema, rounded, widened
 import dash_mantine_components as dmc
 
 
-# ✅ Load Data (Cached for Speed)
-@cache.memoize()
+# ✅ Cold-start report: seconds per startup phase, printed once the module has loaded
+startup_timings = {"imports": round(time.perf_counter() - startup_start, 3)}
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    startup_timings.setdefault(label, round(time.perf_counter() - started, 3))
+    return result
+
+
+# ✅ Plotly Express is only needed to build figures, so it is imported on first use.
+# The lock keeps other threads (and forks, see below) from seeing a partially imported module
+_px_lock = threading.Lock()
+
+def plotly_express():
+    with _px_lock:
+        return timed("plotly.express", lambda: importlib.import_module("plotly.express"))
+
+
+# ✅ Load Data (once per process; memoizing it kept a second pickled copy in memory)
+data_path = config.clean_data_folder / "final_data.parquet"
+dataset_path = config.clean_data_folder / "final_data"  # Year-partitioned copy from prep_data.py
+arrow_path = config.clean_data_folder / "final_data.arrow"  # Pre-sorted Arrow IPC file from prep_data.py
+metadata_path = config.clean_data_folder / "final_data.meta.json"  # Layout metadata from prep_data.py
+cubes_path = config.clean_data_folder / "cubes"  # Weighted state/area_cat/pop_cat aggregates from prep_data.py
+geometry_path = config.clean_data_folder / "geometry"  # Simplified district TopoJSON per resolution from prep_data.py
+
 def load_data():
-    file_path = config.data_folder / "clean" / "final_data.parquet"
-    return pd.read_parquet(file_path)
+    df = pd.read_parquet(data_path)
+    df["year"] = pd.to_numeric(df["year"], errors="coerce").astype(int)  # Ensure integer year
+    if config.COMPACT_MEMORY:
+        df = compact_frame(df)
+    return df
+
+# ✅ DATA_BACKEND=mmap maps the Arrow file read-only (pages shared by all workers);
+# DATA_BACKEND=dataset keeps the rows on disk and reads each view with projection and pushdown;
+# DATA_BACKEND=array converts the rows into a dense [district, year, variable] array
+LoadedData = namedtuple("LoadedData", ["frame", "index", "store", "version"])
+
+def open_data():
+    data_backend = config.DATA_BACKEND
+    backend_paths = {"mmap": arrow_path, "dataset": dataset_path}
+    if data_backend in backend_paths and not backend_paths[data_backend].exists():
+        print(f"⚠️ {backend_paths[data_backend]} not found (run utils/prep_data.py --outputs-only), loading {data_path.name} instead")
+        data_backend = "memory"
+
+    if data_backend == "dataset":
+        store = DataStore(dataset_path)
+        # Districts repeat every year, so one year of the dimension columns is enough for the index
+        index = DistrictIndex(store.read(DIMENSION_COLUMNS + ["year"], years=store.years[:1]))
+        print(f"🗂️ Reading {len(store):,} rows from {dataset_path} on demand")
+        return LoadedData(None, index, store, store.version)
+
+    if data_backend == "array":
+        store = ArrayStore.from_frame(load_data())
+        print(f"🧊 Dense array {store.values.shape} ({store.values.nbytes / 1e6:.1f} MB) for {len(store):,} rows")
+        return LoadedData(None, store.index, store, file_digest(data_path))
+
+    if data_backend == "mmap":
+        # Already in index order and dtype; sorting or compacting here would turn the shared
+        # pages into private per-worker copies
+        index = DistrictIndex(read_arrow(arrow_path), presorted=True)
+        memory_report(index.frame, label="memory-mapped dataset")
+        return LoadedData(index.frame, index, None, file_digest(arrow_path))
+
+    # ✅ Sort by (state, district, year) once and index the contiguous row blocks
+    index = DistrictIndex(load_data())
+    memory_report(index.frame, label="compact dataset" if config.COMPACT_MEMORY else "dataset")
+    return LoadedData(index.frame, index, None, file_digest(data_path))  # ✅ Version changes with the parquet file
+
+
+# ✅ Rows are loaded on first use (first figure, table block or cache warm-up), not at import
+_data = None
+_data_lock = threading.Lock()
+
+def get_data():
+    global _data
+    if _data is None:
+        with _data_lock:
+            if _data is None:
+                _data = timed("data", open_data)
+    return _data
+
+
+def _reset_data_lock():
+    global _data_lock
+    _data_lock = threading.Lock()  # A preloaded master may fork while the warm-up thread holds it
+
+def _reset_px_lock():
+    global _px_lock
+    _px_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_data_lock)
+# A preloaded gunicorn master forks while the warm-up thread may still be importing
+# plotly.express; the fork waits for it, or workers inherit a half-initialized module
+os.register_at_fork(before=lambda: _px_lock.acquire(), after_in_parent=lambda: _px_lock.release(),
+                    after_in_child=_reset_px_lock)
+
+
+def describe_data(data):
+    # Fallback when the sidecar is missing or stale: derive the metadata from the loaded rows
+    if data.store is not None:
+        columns, numeric, data_years = data.store.columns, data.store.numeric_columns, data.store.years
+    else:
+        columns = data.frame.columns
+        numeric = data.frame.select_dtypes(include=["number"]).columns
+        data_years = sorted(data.frame["year"].unique())
+    return build_metadata(data.index, columns, numeric, data_years, data.version)
+
 
-df = load_data()
-df["year"] = pd.to_numeric(df["year"], errors="coerce").astype(int)  # Ensure integer year
-df = df.sort_values("year")  # Sort in ascending order
+# ✅ Everything the layout needs comes from the sidecar written by prep_data.py
+metadata = timed("metadata", lambda: read_metadata(metadata_path, data_path))
+if metadata is None:
+    print(f"⚠️ {metadata_path.name} missing or stale (run utils/prep_data.py --outputs-only), describing the loaded data instead")
+    metadata = describe_data(get_data())
+elif not config.LAZY_DATA or config.BACKGROUND_CALLBACKS:
+    get_data()  # Background jobs are forked from the worker and inherit the loaded rows
+    plotly_express()
+
+data_version = metadata["data_version"]
+data_columns = metadata["columns"]
+numeric_columns = set(metadata["numeric_columns"])
+years = metadata["years"]
+catalog = DistrictCatalog(metadata["districts"], metadata["groups"])
 
 
 # ✅ Variable Mapping
@@ -30,27 +164,81 @@ variable_mapping = {
     "pm25": "pm25"
 }
 
-# ✅ Get Unique States & Districts
-unique_states = sorted(df["state"].unique())
-unique_districts = df["district"].unique()
-# Create category-to-states mapping dynamically
-large_states = sorted(df[df["area_cat"] == "Large"]["state"].unique())
-medium_states = sorted(df[df["area_cat"] == "Medium"]["state"].unique())
-small_states = sorted(df[df["area_cat"] == "Small"]["state"].unique())
-high_pop_states = sorted(df[df["pop_cat"] == "High"]["state"].unique())
-medium_pop_states = sorted(df[df["pop_cat"] == "Medium"]["state"].unique())
-low_pop_states = sorted(df[df["pop_cat"] == "Low"]["state"].unique())
+# ✅ Get Unique States & Districts (category-to-states mapping lives in catalog.groups)
+unique_states = catalog.states
+unique_districts = catalog.districts(unique_states)
+state_district_map = {"groups": catalog.groups, "districts": catalog.state_districts}
+
+# State dropdown entries: the groups, then every state
+state_select_data = [
+    {"label": "All States", "value": "All-states"},
+    {"label": "Large States", "value": "Large-states"},
+    {"label": "Medium States", "value": "Medium-states"},
+    {"label": "Small States", "value": "Small-states"},
+    {"label": "High Population States", "value": "High-pop"},
+    {"label": "Medium Population States", "value": "Medium-pop"},
+    {"label": "Low Population States", "value": "Low-pop"},
+] + [{"label": s, "value": s} for s in unique_states]
+
+# ✅ Map tab: geometry order and resolutions written by prep_data.py (None without the boundaries)
+geometry_index = read_geometry_index(geometry_path)
+geometry_positions = {int(i): pos for pos, i in enumerate(geometry_index["ids"])} if geometry_index else {}
 
 # Required column sequence
 columns_order = ["year", "state", "district", "area_cat", "pop_cat", "area", "pop11", "nightlights", "forest_cover", "pm25"]
 log_columns = ["log_area", "log_pop11", "log_nightlights", "log_forest_cover", "log_pm25"]
 
 
+# ✅ Explore levels: district rows, or the cubes written by prep_data.py
+EXPLORE_LEVELS = {"district": "Districts", "state": "States", "area_cat": "Area category", "pop_cat": "Population category"}
+
+# ✅ Default explore view (also pre-rendered into the figure cache at startup)
+EXPLORE_DEFAULTS = {"x": "forest_cover", "y": "log_nightlights", "size": "pm25", "states": ["High-pop"]}
+
+
 # ✅ Initialize Dash App
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
 app.title = "SHRUG Data Dashboard"
 
+# ✅ Caches live on the real Dash server
+cache.init_app(server)
+figure_cache = FigureCache(server, max_bytes=config.FIGURE_CACHE_MAX_BYTES)
+
+# ✅ /metrics (Prometheus text) and the optional JSON-lines request log
+if config.METRICS_ENABLED:
+    metrics.init_app(app, log_file=config.log_file if config.METRICS_LOG else None)
+    metrics.metrics.gauge("figure_cache_bytes", "Bytes held by the explore figure cache.", lambda: figure_cache.nbytes)
+    metrics.metrics.gauge("figure_cache_entries", "Figures held by the explore figure cache.", lambda: len(figure_cache._items))
+    metrics.metrics.gauge("singleflight_coalesced_total", "Callback computations joined instead of repeated.", lambda: singleflight.info()["coalesced"])
+    metrics.metrics.gauge("singleflight_saved_seconds_total", "Compute seconds the coalesced calls did not spend.", lambda: singleflight.info()["saved_s"])
+
+# ✅ Background explore renders (optional dependency: diskcache, multiprocess, psutil)
+explore_background = {}
+if config.BACKGROUND_CALLBACKS:
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+    except ImportError:
+        print("⚠️ BACKGROUND_CALLBACKS=1 needs `pip install \"dash[diskcache]\"`, rendering explore figures in the request instead")
+    else:
+        # Jobs run in forked processes, so their figures can't land in figure_cache; finished
+        # results are cached on disk instead (shared by workers, keyed on the inputs and data version)
+        background_manager = DiskcacheManager(
+            diskcache.Cache(str(config.cache_folder / "background"), size_limit=config.BACKGROUND_CACHE_MAX_BYTES),
+            cache_by=[lambda: data_version],
+            expire=config.BACKGROUND_CACHE_EXPIRE,
+        )
+        explore_background = dict(
+            background=True,
+            manager=background_manager,
+            running=[
+                (Output("explore-render-status", "children"), "⏳ Rendering…", ""),
+                (Output("explore-cancel", "style"), {}, {"display": "none"}),
+            ],
+            cancel=[Input("explore-cancel", "n_clicks")],
+        )
+
 # ✅ Exploration Layout
 def get_explore_layout():
     return html.Div([
@@ -60,8 +248,8 @@ def get_explore_layout():
                 html.Label("X Variable:", style={"font-weight": "bold"}),
                 dcc.Dropdown(
                     id="x-variable-dropdown",
-                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in df.columns if k not in ["state", "district", "pc11_state_id", "pc11_district_id", "pop_cat", "area_cat"]],
-                    value="forest_cover",
+                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in data_columns if k not in ["state", "district", "pc11_state_id", "pc11_district_id", "pop_cat", "area_cat"]],
+                    value=EXPLORE_DEFAULTS["x"],
                     clearable=False,
                     style={"width": "200px"}
                 ),
@@ -71,8 +259,8 @@ def get_explore_layout():
                 html.Label("Y Variable:", style={"font-weight": "bold"}),
                 dcc.Dropdown(
                     id="y-variable-dropdown",
-                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in df.columns if k not in ["state", "district", "pc11_state_id", "pc11_district_id", "pop_cat", "area_cat", "year"]],
-                    value="log_nightlights",
+                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in data_columns if k not in ["state", "district", "pc11_state_id", "pc11_district_id", "pop_cat", "area_cat", "year"]],
+                    value=EXPLORE_DEFAULTS["y"],
                     clearable=False,
                     style={"width": "200px"}
                 ),
@@ -82,14 +270,34 @@ def get_explore_layout():
                 html.Label("Bubble Size:", style={"font-weight": "bold"}),
                 dcc.Dropdown(
                     id="size-variable-dropdown",
-                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in df.columns if k not in ["state", "district", "year", "pc11_state_id", "pc11_district_id", "pop_cat", "area_cat"]],
-                    value="pm25",  # Default size variable
+                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in data_columns if k not in ["state", "district", "year", "pc11_state_id", "pc11_district_id", "pop_cat", "area_cat"]],
+                    value=EXPLORE_DEFAULTS["size"],  # Default size variable
                     clearable=True,
                     style={"width": "200px"}
                 ),
             ], style={"width": "30%"}),
         ], style={"display": "flex", "gap": "20px", "margin-bottom": "10px"}),
 
+        # ✅ Level of detail: districts, or the pre-aggregated cubes (state bubbles expand on click)
+        html.Div([
+            html.Label("Level:", style={"font-weight": "bold"}),
+            dmc.SegmentedControl(
+                id="explore-level",
+                data=[{"label": label, "value": level} for level, label in EXPLORE_LEVELS.items()],
+                value=config.EXPLORE_LEVEL if config.EXPLORE_LEVEL in EXPLORE_LEVELS else "district",
+            ),
+            # ✅ Streaming download of the district rows behind the current selection
+            html.A("Download CSV", id="explore-export-csv", href="", download=""),
+            html.A("Download Parquet", id="explore-export-parquet", href="", download=""),
+        ], style={"display": "flex", "gap": "10px", "align-items": "center", "margin-bottom": "10px"}),
+        dcc.Store(id="explore-open-states", data=[]),
+
+        # ✅ Background renders: status and a cancel button while a figure is being built
+        html.Div([
+            html.Span(id="explore-render-status"),
+            dmc.Button("Cancel", id="explore-cancel", n_clicks=0, size="xs", variant="outline", style={"display": "none"}),
+        ], style={"display": "flex", "gap": "10px", "align-items": "center"}),
+
         # Loading Wrapper
         dcc.Loading(
             id="loading-explore-graph",
@@ -97,6 +305,22 @@ def get_explore_layout():
             children=[dcc.Graph(id="explore-graph")]
         ),
 
+        # ✅ Lazy frames: one year is rendered, other years are fetched when the slider moves
+        html.Div([
+            dcc.Slider(
+                id="explore-year-slider",
+                min=years[0],
+                max=years[-1],
+                step=1,
+                value=config.DEFAULT_YEAR if config.DEFAULT_YEAR in years else years[0],
+                marks={int(y): str(y) for y in years if y % 5 == 0 or y in (years[0], years[-1])},
+                tooltip={"placement": "bottom"},
+            ),
+        ], style={} if config.EXPLORE_LAZY_FRAMES else {"display": "none"}),
+
+        # ✅ Static state -> district and group -> state mappings for the clientside expansion
+        dcc.Store(id="state-district-map", data=state_district_map),
+
         # State & District Selection
         html.Div([
             html.Div([
@@ -110,16 +334,8 @@ def get_explore_layout():
                         dmc.PopoverDropdown(
                             dmc.MultiSelect(
                                 id="state-dropdown",
-                                data=[
-                                    {"label": "All States", "value": "All-states"},
-                                    {"label": "Large States", "value": "Large-states"},
-                                    {"label": "Medium States", "value": "Medium-states"},
-                                    {"label": "Small States", "value": "Small-states"},
-                                    {"label": "High Population States", "value": "High-pop"},
-                                    {"label": "Medium Population States", "value": "Medium-pop"},
-                                    {"label": "Low Population States", "value": "Low-pop"},
-                                ] + [{"label": s, "value": s} for s in unique_states],
-                                value=["High-pop"],  
+                                data=state_select_data,
+                                value=EXPLORE_DEFAULTS["states"],  
                                 searchable=True,
                                 clearable=True,
                                 style={"width": "100%"},
@@ -161,7 +377,64 @@ def get_explore_layout():
             - **Districts** can be selected/deselected based on the chosen states.  
             - **X-axis** and **Y-axis** variables can be selected from the dropdowns. By default these are Forest Cover and Log Nightlights.  
             - **Bubble size** can be selected from the dropdown and is also clearable.  
+            - **Level** switches between districts and state / area category / population category averages (Nightlights and PM2.5 weighted by population, Forest Cover by area). At the state level, click a state bubble to show its districts and click again to fold them back.  
+
+            """, style={"margin-top": "20px", "font-size": "14px", "line-height": "1.5"})
+        ])
+    ])
+
+
+
+def get_map_layout():
+    if geometry_index is None:
+        return html.Div(dcc.Markdown(
+            "**Map unavailable:** the district geometries have not been built. "
+            "Run `python utils/prep_data.py` with `district.gpkg` and `state.gpkg` in `data/raw/`."
+        ))
+    return html.Div([
+        html.Div([
+            html.Div([
+                html.Label("Variable:", style={"font-weight": "bold"}),
+                dcc.Dropdown(
+                    id="map-variable-dropdown",
+                    options=[{"label": k.replace("_", " ").title(), "value": k} for k in data_columns if k in numeric_columns and k not in ["year", "pc11_state_id", "pc11_district_id"]],
+                    value=EXPLORE_DEFAULTS["y"],
+                    clearable=False,
+                    style={"width": "200px"}
+                ),
+            ], style={"width": "30%"}),
+            html.Div([
+                html.Label("States:", style={"font-weight": "bold"}),
+                dmc.MultiSelect(id="map-state-dropdown", data=state_select_data, value=["All-states"], searchable=True, clearable=True),
+            ], style={"width": "50%"}),
+        ], style={"display": "flex", "gap": "20px", "margin-bottom": "10px"}),
+
+        dcc.Slider(
+            id="map-year-slider",
+            min=years[0],
+            max=years[-1],
+            step=1,
+            value=config.DEFAULT_YEAR if config.DEFAULT_YEAR in years else years[0],
+            marks={int(y): str(y) for y in years if y % 5 == 0 or y in (years[0], years[-1])},
+            tooltip={"placement": "bottom"},
+        ),
+
+        # ✅ Geometries are fetched once per resolution and kept by the browser; the server
+        # only sends the value vector for the selected variable, year and states
+        dcc.Store(id="map-values"),
+        dcc.Store(id="map-geometry", data={
+            "url": app.get_relative_path("/geometry/"),
+            "version": geometry_index["version"],
+            "levels": list(geometry_index["levels"]),
+        }),
+        dcc.Loading(type="circle", children=[dcc.Graph(id="map-graph", config={"scrollZoom": True})]),
+
+        html.Div([
+            dcc.Markdown("""
+            **Note:**  
 
+            - Colours use one scale across all years of the selected variable and states, so years can be compared.  
+            - District shapes are simplified: coarser outlines when many districts are shown, finer ones when few are selected or when zoomed in.  
             """, style={"margin-top": "20px", "font-size": "14px", "line-height": "1.5"})
         ])
     ])
@@ -169,17 +442,34 @@ def get_explore_layout():
 
 
 def get_compare_layout():
+    if config.GRID_ROW_MODEL == "infinite":
+        # ✅ Rows are requested block by block through getRowsRequest
+        grid_props = {
+            "rowModelType": "infinite",
+            "dashGridOptions": {
+                "pagination": True,
+                "paginationPageSize": config.GRID_PAGE_SIZE,
+                "cacheBlockSize": config.GRID_BLOCK_SIZE,
+                "maxBlocksInCache": 10,
+                "rowBuffer": 0,
+            },
+        }
+    else:
+        grid_props = {
+            "rowData": [],
+            "dashGridOptions": {"pagination": True, "paginationPageSize": config.GRID_PAGE_SIZE},
+        }
+
     return html.Div([
         dcc.Loading(
             type="default",
             children=html.Div([
                 AgGrid(id="compare-grid", 
                        columnDefs=[], 
-                       rowData=[],
                        defaultColDef={"resizable": True, "sortable": True, "filter": True, "minWidth": 70},  # ✅ Ensures minWidth applied
                        columnSize="sizeToFit",  
-                       dashGridOptions={"pagination": True, "paginationPageSize": 10},
-                       className="ag-theme-alpine")
+                       className="ag-theme-alpine",
+                       **grid_props)
             ])
         ),
         html.Div([
@@ -187,7 +477,10 @@ def get_compare_layout():
                 id="show-log-values",
                 options=[{"label": "Show Log Values", "value": "show"}],
                 value=[]
-            )
+            ),
+            # ✅ Streaming download of the table in its current sort and filter
+            html.A("Download CSV", id="table-export-csv", href="", download=""),
+            html.A("Download Parquet", id="table-export-parquet", href="", download=""),
         ], style={"display": "flex", "gap": "10px"}),
 
         # Adding the note at the bottom
@@ -228,6 +521,7 @@ app.layout = dmc.MantineProvider(
                             children=[
                                 dmc.TabsTab("🔄 Tabular Data", value="compare", style={"fontWeight": "bold"}),
                                 dmc.TabsTab("📊 Graphical Exploration", value="explore", style={"fontWeight": "bold"}),
+                                dmc.TabsTab("🗺️ Map", value="map", style={"fontWeight": "bold"}),
                             ],
                         ),
                     ],
@@ -276,6 +570,8 @@ def update_main_tab(selected_tab):
             return get_compare_layout()
         elif selected_tab == "explore":
             return get_explore_layout()
+        elif selected_tab == "map":
+            return get_map_layout()
         else:
             return html.Div("Invalid tab selected")
     except Exception as e:
@@ -285,60 +581,90 @@ def update_main_tab(selected_tab):
 
     
 # ✅ Update Districts Based on Selected States
-@app.callback(
-    [Output("district-dropdown", "data"),
-     Output("district-dropdown", "value"),
-     Output("state-dropdown", "value")],
-    Input("state-dropdown", "value")
-)
 def update_district_options(selected_states):
     if not selected_states:
         return [], [], []
 
-    # Expand categories into actual states
-    area_mapping = {
-        "Large-states": large_states,
-        "Medium-states": medium_states,
-        "Small-states": small_states,
-    }
-    pop_mapping = {
-        "High-pop": high_pop_states,
-        "Medium-pop": medium_pop_states,
-        "Low-pop": low_pop_states,
-    }
+    # Expand categories into actual states; only states remain in the final selection
+    modified_selection = catalog.expand(selected_states)
 
-    all_mapping ={
-        "All-states": unique_states
-    }
+    # Get districts based on the final expanded state list (sorted by state, then district)
+    filtered_districts = catalog.districts(modified_selection)
+    metrics.record_rows(len(filtered_districts))
+    district_options = [{"label": d, "value": d} for d in filtered_districts]
 
-    # Expand selected categories into actual states
-    expanded_states = set()
-    for state in selected_states:
-        if state in area_mapping:
-            expanded_states.update(area_mapping[state])
-        elif state in pop_mapping:
-            expanded_states.update(pop_mapping[state])
-        elif state in all_mapping:
-            expanded_states.update(all_mapping[state])
-        else:
-            expanded_states.add(state)  # Add actual states
+    return district_options, filtered_districts, modified_selection
 
-    # Ensure only states remain in the final selection (remove category labels)
-    modified_selection = sorted(list(expanded_states))
 
-    # Get districts based on the final expanded state list
-    filtered_districts = (
-        df[df["state"].isin(expanded_states)]
-        .sort_values(["state", "district"])  # Sort first by state, then by district
-        ["district"]
-        .unique()
+# ✅ The state/district mapping is static, so by default the expansion runs in the
+# browser from the state-district-map store; the server callback is the fallback
+district_options_io = dict(
+    output=[Output("district-dropdown", "data"),
+            Output("district-dropdown", "value"),
+            Output("state-dropdown", "value")],
+    inputs=Input("state-dropdown", "value"),
+)
+if config.CLIENTSIDE_DISTRICT_OPTIONS:
+    app.clientside_callback(
+        ClientsideFunction(namespace="explore", function_name="expandStates"),
+        **district_options_io,
+        state=State("state-district-map", "data"),
     )
-    district_options = [{"label": d, "value": d} for d in filtered_districts]
+else:
+    app.callback(**district_options_io)(update_district_options)
+
 
-    return district_options, filtered_districts, modified_selection
 
 
 
+# ✅ Canonical form of an explore selection: expanded states plus the selected
+# districts within them (None when every district of those states is selected)
+def normalize_explore_selection(selected_states, selected_districts):
+    selected_states = selected_states or []
+    selected_districts = selected_districts or []
+
+    if isinstance(selected_states, str):
+        selected_states = [selected_states]
+    if isinstance(selected_districts, str):
+        selected_districts = [selected_districts]
+
+    expanded_states = catalog.expand(selected_states)
+    if not selected_districts:
+        return expanded_states, None
+
+    available = catalog.districts(expanded_states)
+    wanted = set(selected_districts)
+    districts = [d for d in available if d in wanted]
+    return expanded_states, (None if len(districts) == len(available) else districts)
+
+
+def explore_cache_key(x_var, y_var, size_var, expanded_states, districts, year=None, level="district", open_states=()):
+    district_key = "*" if districts is None else digest(districts)
+    return (x_var, y_var, size_var or None, tuple(expanded_states), district_key, year, data_version, level, tuple(open_states))
+
+
+# ✅ Serialized figure for a selection (all years as animation frames, or a single year)
+def get_explore_figure_json(x_var, y_var, size_var, selected_states, selected_districts, year=None, level="district", open_states=None):
+    expanded_states, districts = normalize_explore_selection(selected_states, selected_districts)
+    level = level if level in EXPLORE_LEVELS else "district"
+    # Only expanded states that are selected matter, so other toggles share the cache entry
+    open_states = [s for s in expanded_states if s in set(open_states or [])] if level == "state" else []
+    key = explore_cache_key(x_var, y_var, size_var, expanded_states, districts, year, level, open_states)
+
+    body = figure_cache.get(key)
+    metrics.record_cache("figure", body is not None)
+    if body is None:
+        def build():
+            if level == "district":
+                fig = build_explore_figure(x_var, y_var, size_var, expanded_states, districts, year)
+            else:
+                fig = build_drilldown_figure(x_var, y_var, size_var, level, expanded_states, districts, open_states, year)
+            body = fig.to_json().encode("utf-8")
+            figure_cache.set(key, body)
+            return body
+        # ✅ Many visitors opening the same view at once: one build, the others wait for it
+        body = singleflight.do("update_explore_graph", key, build)
+    return body
 
 
 @app.callback(
@@ -347,142 +673,441 @@ def update_district_options(selected_states):
      Input("y-variable-dropdown", "value"),
      Input("size-variable-dropdown", "value"),
      Input("state-dropdown", "value"),
-     Input("district-dropdown", "value")]
+     Input("district-dropdown", "value"),
+     Input("explore-level", "value"),
+     Input("explore-open-states", "data")],
+    State("explore-year-slider", "value"),
+    **explore_background,
 )
-def update_explore_graph(x_var, y_var, size_var, selected_states, selected_districts):
-    selected_states = selected_states or []
-    selected_districts = selected_districts or []
+def update_explore_graph(x_var, y_var, size_var, selected_states, selected_districts, level="district", open_states=None, year=None):
+    year = year if config.EXPLORE_LAZY_FRAMES else None
+    return json.loads(get_explore_figure_json(x_var, y_var, size_var, selected_states, selected_districts, year, level, open_states))
 
 
+# ✅ Drill-down: clicking a state bubble loads its districts, clicking one of them folds it back
+@app.callback(
+    Output("explore-open-states", "data"),
+    Input("explore-graph", "clickData"),
+    Input("explore-level", "value"),
+    State("explore-open-states", "data"),
+    prevent_initial_call=True,
+)
+def toggle_open_state(click_data, level, open_states):
+    if ctx.triggered_id == "explore-level" or level != "state":
+        return [] if open_states else no_update
+    point = ((click_data or {}).get("points") or [{}])[0]
+    code = (point.get("customdata") or [None])[0]  # Position in catalog.states (see build_drilldown_figure)
+    if not isinstance(code, int) or not 0 <= code < len(catalog.states):
+        return no_update
+    return sorted(set(open_states or []) ^ {catalog.states[code]})
+
+
+# ✅ One year of the explore figure, fetched by the clientside slider callback
+@server.route("/explore-frame", methods=["POST"])
+def explore_frame():
+    params = request.get_json(force=True)
+    body = get_explore_figure_json(
+        params["x"], params["y"], params.get("size"),
+        params.get("states"), params.get("districts"), int(params["year"]),
+        params.get("level") or "district", params.get("open"),
+    )
+    return Response(body, mimetype="application/json")
+
+
+if config.EXPLORE_LAZY_FRAMES:
+    app.clientside_callback(
+        ClientsideFunction(namespace="explore", function_name="showYear"),
+        Output("explore-graph", "figure", allow_duplicate=True),
+        Input("explore-year-slider", "value"),
+        State("x-variable-dropdown", "value"),
+        State("y-variable-dropdown", "value"),
+        State("size-variable-dropdown", "value"),
+        State("state-dropdown", "value"),
+        State("district-dropdown", "value"),
+        State("explore-level", "value"),
+        State("explore-open-states", "data"),
+        prevent_initial_call=True,
+    )
 
-    if isinstance(selected_states, str):
-        selected_states = [selected_states]
-    if isinstance(selected_districts, str):
-        selected_districts = [selected_districts]
-    
-    # Expand categories to actual states
-    area_mapping = {
-        "Large-states": large_states,
-        "Medium-states": medium_states,
-        "Small-states": small_states,
-    }
 
-    pop_mapping = {
-        "High-pop": high_pop_states,
-        "Medium-pop": medium_pop_states,
-        "Low-pop": low_pop_states,
+# ✅ Rows of a selection projected to `columns`, in (state, district, year) order
+def read_view(columns, states, districts=None, year=None):
+    if districts is not None and not districts:
+        states = []
+    data = get_data()
+    if data.store is not None:
+        view = data.store.read(columns, states=states, districts=districts, years=None if year is None else [year])
+        if isinstance(data.store, DataStore):  # ArrayStore reads come out in this order already
+            order = [c for c in ["state", "district", "year"] if c in view.columns]  # Only what was read
+            view = view.sort_values(order, kind="stable").reset_index(drop=True)
+    else:
+        view = data.index.take(states, districts)[columns]
+        view = view if year is None else view[view["year"] == year]
+    metrics.record_rows(len(view))
+    return view
+
+
+# ✅ Cubes are small (one row per state or category and year) and loaded once per worker
+_cubes = {}
+
+def get_cube(level):
+    if level not in _cubes:
+        cube = read_cube(cubes_path, level, data_version)
+        if cube is None:
+            print(f"⚠️ {level} cube missing or stale (run utils/prep_data.py --outputs-only), aggregating the loaded data instead")
+            data = get_data()
+            columns = list(dict.fromkeys(CUBE_LEVELS[level] + ["year", "pc11_district_id", "area", "pop11"] + CUBE_MEASURES))
+            cube = build_cube(data.store.read_table(columns) if data.store is not None else data.frame[columns], level)
+        _cubes[level] = cube
+    return _cubes[level]
+
+
+# ✅ Cube rows for the selected states; category cubes cover every state, so a partial
+# selection is rolled up from its state rows instead
+def read_cube_view(level, states):
+    state_cube = get_cube("state")
+    if level == "state":
+        view = state_cube[state_cube["state"].isin(states)]
+    elif set(states) >= set(catalog.states):
+        view = get_cube(level)
+    else:
+        view = roll_up(state_cube[state_cube["state"].isin(states)], level)
+    metrics.record_rows(len(view))
+    return view
+
+
+# ✅ Pick the renderer from the number of points in one animation frame
+RENDER_MODE_LABELS = {"svg": "SVG", "webgl": "WebGL", "density": "binned density"}
+
+def choose_render_mode(points_per_frame):
+    if points_per_frame > config.EXPLORE_DENSITY_THRESHOLD:
+        return "density"
+    if points_per_frame > config.EXPLORE_WEBGL_THRESHOLD:
+        return "webgl"
+    return "svg"
+
+
+def build_density_figure(df_filtered, x_var, y_var, range_x, range_y, title, year=None):
+    # Bin points server-side so each frame ships at most bins x bins cells, not every district
+    px = plotly_express()
+    bins = config.EXPLORE_DENSITY_BINS
+    df_filtered = df_filtered.dropna(subset=[x_var, y_var])
+    x_size = (range_x[1] - range_x[0]) / bins or 1.0
+    y_size = (range_y[1] - range_y[0]) / bins or 1.0
+
+    x_bin = np.clip((df_filtered[x_var].to_numpy(dtype=float) - range_x[0]) // x_size, 0, bins - 1)
+    y_bin = np.clip((df_filtered[y_var].to_numpy(dtype=float) - range_y[0]) // y_size, 0, bins - 1)
+    binned = pd.DataFrame({
+        "year": df_filtered["year"].to_numpy(),
+        x_var: range_x[0] + (x_bin + 0.5) * x_size,
+        y_var: range_y[0] + (y_bin + 0.5) * y_size,
+    }).groupby(["year", x_var, y_var]).size().reset_index(name="districts")
+    max_count = binned["districts"].max()  # Over all years, so lazily fetched years share a scale
+    if year is not None:
+        binned = binned[binned["year"] == year]
+
+    fig = px.density_heatmap(
+        binned,
+        x=x_var,
+        y=y_var,
+        z="districts",
+        histfunc="sum",
+        animation_frame="year" if year is None else None,
+        range_x=list(range_x),
+        range_y=list(range_y),
+        range_color=[0, max_count],  # Same colour scale in every frame
+        color_continuous_scale="Viridis",
+        labels={x_var: x_var.replace("_", " ").title(), y_var: y_var.replace("_", " ").title(), "year": "Year"},
+        title=title,
+    )
+    bin_spec = {
+        "xbins": {"start": range_x[0], "end": range_x[1], "size": x_size},
+        "ybins": {"start": range_y[0], "end": range_y[1], "size": y_size},
     }
+    fig.update_traces(**bin_spec)
+    for frame in fig.frames:
+        for trace in frame.data:
+            trace.update(**bin_spec)
+    return fig
 
-    expanded_states = set()
-    for state in selected_states:
-        if state in area_mapping:
-            expanded_states.update(area_mapping[state])
-        elif state in pop_mapping:
-            expanded_states.update(pop_mapping[state])
-        else:
-            expanded_states.add(state)  # It's an individual state
-            
 
-    
-    df_filtered = df[df["state"].isin(expanded_states)]
-    
-    if selected_districts:
-        df_filtered = df_filtered[df_filtered["district"].isin(selected_districts)]
+def build_explore_figure(x_var, y_var, size_var, expanded_states, districts=None, year=None):
+    # year=None animates every year; a single year is used by the lazy-frames mode
+    px = plotly_express()
+    # ✅ Only the columns the figure uses, for the selected states (and districts)
+    plot_columns = list(dict.fromkeys(["year", "state", "district", "pc11_district_id", x_var, y_var] + ([size_var] if size_var else [])))
+    df_filtered = read_view(plot_columns, expanded_states, districts)
 
     if df_filtered.empty:
         return px.scatter(title="No data available for selected filters")
 
-    
 
     # Define margins for better visibility
-    x_margin = (df_filtered[x_var].max() - df_filtered[x_var].min()) * 0.05  # 5% of the range
-    y_margin = (df_filtered[y_var].max() - df_filtered[y_var].min()) * 0.05  # 5% of the range
-    # Format the numerical columns to two decimal places for hover data
-    df_filtered["x_var_formatted"] = df_filtered[x_var].apply(lambda x: f"{x:.2f}" if isinstance(x, float) and not x.is_integer() else f"{int(x)}")
-    df_filtered["y_var_formatted"] = df_filtered[y_var].apply(lambda x: f"{x:.2f}" if isinstance(x, float) and not x.is_integer() else f"{int(x)}")
-    if size_var:
-        df_filtered["size_var_formatted"] = df_filtered[size_var].apply(
-            lambda x: f"{x:.2f}" if isinstance(x, float) and not x.is_integer() else f"{int(x)}"
-        )
-    else:
-        df_filtered["size_var_formatted"] = None  # Or df_filtered["size_var_formatted"] = ""
+    x_min, x_max = df_filtered[x_var].min(), df_filtered[x_var].max()
+    y_min, y_max = df_filtered[y_var].min(), df_filtered[y_var].max()
+    x_margin = (x_max - x_min) * 0.05  # 5% of the range
+    y_margin = (y_max - y_min) * 0.05  # 5% of the range
 
+    # ✅ Plain strings keep Plotly Express off the slow categorical path and keep
+    # animation ids as strings in compact mode
     df_filtered = df_filtered.sort_values(by=["year", "state"])  # ✅ Sort by year, then state
+    df_filtered = df_filtered.astype({"state": str, "district": str, "pc11_district_id": str})
+
+    points_per_frame = int(df_filtered["year"].value_counts().max())
+    render_mode = choose_render_mode(points_per_frame)
+    title = f"{y_var.replace('_', ' ').title()} vs {x_var.replace('_', ' ').title()} Over Time"
+    if year is not None:
+        title = f"{y_var.replace('_', ' ').title()} vs {x_var.replace('_', ' ').title()} in {year}"
+    if render_mode != "svg":
+        title += f" ({RENDER_MODE_LABELS[render_mode]}, {points_per_frame} districts per year)"
+    render_meta = {"render_mode": render_mode, "points_per_frame": points_per_frame}
+
+    if render_mode == "density":
+        fig = build_density_figure(df_filtered, x_var, y_var, (x_min - x_margin, x_max + x_margin), (y_min - y_margin, y_max + y_margin), title, year)
+        fig.update_layout(meta=render_meta, uirevision="explore")
+        return fig
+
+    # Colours and bubble scale come from the whole selection so every year matches
+    state_colors = {state: color for state, color in zip(sorted(df_filtered["state"].unique()), px.colors.qualitative.Prism)}
+    size_max = df_filtered[size_var].max() if size_var else None
+    if year is not None:
+        df_filtered = df_filtered[df_filtered["year"] == year]
+        if df_filtered.empty:
+            return px.scatter(title=f"No data available for {year}")
 
-
-
-
-
-
-    
     # Create the plot with formatted hover data and custom labels
     fig = px.scatter(
         df_filtered, 
         x=x_var, 
         y=y_var, 
-        animation_frame="year",
-        animation_group="pc11_district_id",
+        animation_frame="year" if year is None else None,
+        animation_group="pc11_district_id" if year is None else None,
         color="state",
         opacity=0.7,  # Adjust opacity for better visibility
         # color_discrete_sequence=px.colors.qualitative.Plotly,
         # color_palette = px.colors.qualitative.Dark24 + px.colors.qualitative.Light24,
         # color_discrete_map={state: color for state, color in zip(sorted(df_filtered["state"].unique()), px.colors.qualitative.Dark24 + px.colors.qualitative.Light24)},
-        color_discrete_map={state: color for state, color in zip(sorted(df_filtered["state"].unique()), px.colors.qualitative.Prism)},
+        color_discrete_map=state_colors,
         size=size_var if size_var else None,  # Conditionally include size
-        hover_data={
-            "district": True, 
-            "state": True, 
-            "year": False,
-            x_var: False,
-            y_var: False,
-            size_var: False if size_var else None,  # Ensure it doesn’t appear in hover data if blank
-            "x_var_formatted": True, 
-            "y_var_formatted": True, 
-            "size_var_formatted": True if size_var else False,
-        },
-        range_x=[df_filtered[x_var].min() - x_margin, df_filtered[x_var].max() + x_margin],
-        range_y=[df_filtered[y_var].min() - y_margin, df_filtered[y_var].max() + y_margin],
+        hover_name="district",
+        hover_data={col: False for col in plot_columns},
+        range_x=[x_min - x_margin, x_max + x_margin],
+        range_y=[y_min - y_margin, y_max + y_margin],
         labels={x_var: x_var.replace("_", " ").title(), 
                 y_var: y_var.replace("_", " ").title(), 
-                "year": "Year", 
-                "x_var_formatted": f"{x_var.replace('_', ' ').title()}", 
-                "y_var_formatted": f"{y_var.replace('_', ' ').title()}"} | ({"size_var_formatted": f"{size_var.replace('_', ' ').title()}"} if size_var else {}),
-        title=f"{y_var.replace('_', ' ').title()} vs {x_var.replace('_', ' ').title()} Over Time",
-        render_mode="svg"
+                "year": "Year"} | ({size_var: size_var.replace("_", " ").title()} if size_var else {}),
+        title=title,
+        render_mode=render_mode
     )
 
-    
 
+    # ✅ Hover values are formatted by Plotly's hovertemplate (two decimals, trailing
+    # zeros trimmed), so no per-row formatted string columns are built or shipped
+    hover_lines = [
+        "<b>%{hovertext}</b>",
+        "State=%{fullData.name}",
+        f"{x_var.replace('_', ' ').title()}=%{{x:.2~f}}",
+        f"{y_var.replace('_', ' ').title()}=%{{y:.2~f}}",
+    ]
+    if size_var:
+        hover_lines.append(f"{size_var.replace('_', ' ').title()}=%{{marker.size:.2~f}}")
+    fig.update_traces(hovertemplate="<br>".join(hover_lines) + "<extra></extra>", customdata=None)
+    if year is not None and size_var:
+        fig.update_traces(marker_sizeref=2.0 * size_max / (20 ** 2))  # Plotly Express default size_max=20
+    for frame in fig.frames:
+        for trace in frame.data:
+            trace.hovertemplate = None  # Frames inherit the template from the base traces
+            trace.customdata = None
+
+    fig.update_layout(coloraxis_colorbar_title=y_var, meta=render_meta, uirevision="explore")
+    return fig
+
+
+def build_drilldown_figure(x_var, y_var, size_var, level, expanded_states, districts=None, open_states=(), year=None):
+    # One bubble per state or category from the cubes; district rows are read only for the
+    # states opened by clicking their bubble
+    px = plotly_express()
+    variables = list(dict.fromkeys([x_var, y_var] + ([size_var] if size_var else [])))
+    color = "state" if level == "state" else level
+
+    coarse = read_cube_view(level, expanded_states)
+    if level == "state":
+        coarse = coarse[~coarse["state"].isin(open_states)]
+    coarse = coarse[["year", color] + [v for v in variables if v not in ("year", color)]].copy()
+    coarse[color] = coarse[color].astype(str)
+    coarse["name"] = coarse[color] + (" (state average)" if level == "state" else f" {EXPLORE_LEVELS[level].lower()}")
+    coarse["kind"] = EXPLORE_LEVELS[level].removesuffix("s")
+    parts = [coarse]
+    if open_states:
+        plot_columns = list(dict.fromkeys(["year", "state", "district"] + variables))
+        rows = read_view(plot_columns, list(open_states), districts).astype({"state": str, "district": str})
+        parts.append(rows.rename(columns={"district": "name"}).assign(kind="District"))
+    df_filtered = pd.concat(parts, ignore_index=True).dropna(subset=[x_var, y_var])
+
+    if df_filtered.empty:
+        return px.scatter(title="No data available for selected filters")
 
-    fig.update_layout(coloraxis_colorbar_title=y_var)
+    x_min, x_max = df_filtered[x_var].min(), df_filtered[x_var].max()
+    y_min, y_max = df_filtered[y_var].min(), df_filtered[y_var].max()
+    x_margin = (x_max - x_min) * 0.05
+    y_margin = (y_max - y_min) * 0.05
+
+    df_filtered = df_filtered.sort_values(by=["year", color], kind="stable")
+    # Points carry a small integer code (position in catalog.states at the state level) that
+    # picks their colour from a stepped colour scale and identifies the state on click; numeric
+    # arrays ship as compact typed arrays instead of one string per point
+    groups = catalog.states if level == "state" else sorted(df_filtered[color].unique())
+    df_filtered["code"] = df_filtered[color].map({value: i for i, value in enumerate(groups)}).astype(np.int16)
+    palette = px.colors.qualitative.Prism
+    colorscale = [[(i + edge) / len(groups), palette[i % len(palette)]] for i in range(len(groups)) for edge in (0, 1)]
+    size_max = df_filtered[size_var].max() if size_var else None
+    points_per_frame = int(df_filtered["year"].value_counts().max())
+    render_mode = "svg" if choose_render_mode(points_per_frame) == "svg" else "webgl"
+
+    title = f"{y_var.replace('_', ' ').title()} vs {x_var.replace('_', ' ').title()} by {EXPLORE_LEVELS[level].lower()}"
+    title += f" in {year}" if year is not None else " Over Time"
+    if open_states:
+        title += f" ({len(open_states)} state{'s' if len(open_states) > 1 else ''} expanded)"
+    if year is not None:
+        df_filtered = df_filtered[df_filtered["year"] == year]
+        if df_filtered.empty:
+            return px.scatter(title=f"No data available for {year}")
+
+    fig = px.scatter(
+        df_filtered,
+        x=x_var,
+        y=y_var,
+        animation_frame="year" if year is None else None,
+        animation_group="name" if year is None else None,
+        symbol="kind",  # One trace per kind and frame; colours are set per point below
+        symbol_map={"State": "diamond", "District": "circle"},
+        opacity=0.7,
+        size=size_var if size_var else None,
+        hover_name="name",
+        custom_data=["code"],  # Read by toggle_open_state on click
+        range_x=[x_min - x_margin, x_max + x_margin],
+        range_y=[y_min - y_margin, y_max + y_margin],
+        labels={x_var: x_var.replace("_", " ").title(),
+                y_var: y_var.replace("_", " ").title(),
+                "year": "Year", "kind": "Level"} | ({size_var: size_var.replace("_", " ").title()} if size_var else {}),
+        title=title,
+        render_mode=render_mode,
+    )
+
+    hover_lines = [
+        "<b>%{hovertext}</b>",
+        f"{x_var.replace('_', ' ').title()}=%{{x:.2~f}}",
+        f"{y_var.replace('_', ' ').title()}=%{{y:.2~f}}",
+    ]
+    if size_var:
+        hover_lines.append(f"{size_var.replace('_', ' ').title()}=%{{marker.size:.2~f}}")
+    fig.update_traces(hovertemplate="<br>".join(hover_lines) + "<extra></extra>")
+    if year is not None and size_var:
+        fig.update_traces(marker_sizeref=2.0 * size_max / (20 ** 2))  # Plotly Express default size_max=20
+    for trace in list(fig.data) + [t for frame in fig.frames for t in frame.data]:
+        trace.marker.color = np.asarray(trace.customdata)[:, 0]
+    fig.update_traces(marker=dict(colorscale=colorscale, cmin=-0.5, cmax=len(groups) - 0.5, showscale=False))  # Frames inherit it
+    for frame in fig.frames:
+        for trace in frame.data:
+            trace.hovertemplate = None
+
+    render_meta = {"render_mode": render_mode, "points_per_frame": points_per_frame, "level": level, "open_states": list(open_states)}
+    fig.update_layout(meta=render_meta, uirevision="explore")
     return fig
 
 
+# ✅ Pre-render the default views in the background so first visitors hit the cache
+def warm_figure_cache():
+    for states in [EXPLORE_DEFAULTS["states"], ["All-states"]]:
+        update_explore_graph(EXPLORE_DEFAULTS["x"], EXPLORE_DEFAULTS["y"], EXPLORE_DEFAULTS["size"], states, None)
+    print(f"🔥 Figure cache warmed: {figure_cache.info()}")
+
+
+@server.route("/figure-cache/stats")
+def figure_cache_stats():
+    return jsonify(figure_cache.info())
+
+
+@server.route("/singleflight/stats")
+def singleflight_stats():
+    return jsonify(singleflight.info())
+
+
+def start_figure_cache_warmup():
+    if config.FIGURE_CACHE_WARM:
+        threading.Thread(target=warm_figure_cache, name="warm-figure-cache", daemon=True).start()
+
+
+if not config.WARM_AFTER_FORK:
+    start_figure_cache_warmup()
+
+
+# ✅ Columns shown in the compare grid
+def table_columns(log_enabled):
+    display_columns = columns_order + (log_columns if log_enabled else [])
+    return [col for col in display_columns if col in data_columns]
+
+
+# ✅ Sorted + rounded table frame (snapshotted once per data version and log toggle).
+# Bump TABLE_SNAPSHOT_VERSION whenever the frame's columns, order or rounding change.
+TABLE_SNAPSHOT_VERSION = 3
+
+
+def build_table_frame(log_enabled):
+    # Ensure correct column selection
+    valid_columns = table_columns(log_enabled)
+    data = get_data()
+    source = data.frame[valid_columns] if data.store is None else data.store.read(valid_columns)
+
+    # Select columns first so dropna/sort only copy what the table shows
+    df_sorted1 = source.dropna(subset=["year", "state", "district"]) \
+               .sort_values(["year", "state", "district"], ascending=[False, True, True])
+
+    # ✅ Format float columns to 2 decimal places (in float64: rounding float32 in place
+    # turns 4081148.0 into 4081148.25)
+    float_cols = df_sorted1.select_dtypes(include=["float"]).columns  # Identify float columns
+    df_sorted1[float_cols] = df_sorted1[float_cols].astype("float64").round(2)
+
+    return df_sorted1.reset_index(drop=True)
+
+
+# Keyed on the frame format version too, so snapshots written by an older build_table_frame are dropped,
+# and on the backend and dtype mode, since float32 columns round differently from the originals
+table_snapshots = TableSnapshots(build_table_frame, digest([data_version, f"format={TABLE_SNAPSHOT_VERSION}",
+                                                            f"backend={config.DATA_BACKEND}", f"compact={config.COMPACT_MEMORY}"]),
+                                 config.cache_folder / "snapshots", decimals=2)
+
+
+# ✅ Serve the pre-encoded table with ETag revalidation (304 when unchanged)
+@server.route("/table-snapshot/stats")
+def table_snapshot_stats():
+    return jsonify(table_snapshots.stats)
+
+
+@server.route("/table-snapshot/<variant>")
+def table_snapshot(variant):
+    if variant not in ("plain", "log"):
+        abort(404)
+    snapshot = table_snapshots.get(variant == "log")
+
+    if snapshot.etag in request.if_none_match:
+        table_snapshots.stats["not_modified"] += 1
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.body, mimetype="application/json")
+    response.set_etag(snapshot.etag)
+    response.headers["Cache-Control"] = "no-cache"  # Always revalidate, usually a 304
+    return response
+
+
 @app.callback(
     Output("compare-grid", "columnDefs"),
-    Output("compare-grid", "rowData"),
     Output("compare-grid", "key"),  # ✅ Forces re-render on column changes
     Input("show-log-values", "value"),
 )
 def update_table(log_toggle):
     log_enabled = "show" in log_toggle  # ✅ Convert list to boolean
 
-    # Ensure correct column selection
-    display_columns = columns_order + (log_columns if log_enabled else [])
-    valid_columns = [col for col in display_columns if col in df.columns]
-
-    # Sort and filter dataframe
-    df_sorted1 = df.dropna(subset=["year", "state", "district"]) \
-               .sort_values(["year", "state", "district"], ascending=[False, True, True])[valid_columns]
-
-    # ✅ Format float columns to 2 decimal places using .map()
-    float_cols = df_sorted1.select_dtypes(include=["float"]).columns  # Identify float columns
-    for col in float_cols:
-        df_sorted1[col] = df_sorted1[col].map(lambda x: round(x, 2) if pd.notna(x) else x)
-
-    rowData = df_sorted1.to_dict("records")
-    # print(df_sorted1.head())
-
     # Explicitly set column definitions
     columnDefs = [
         {
@@ -492,13 +1117,193 @@ def update_table(log_toggle):
             "minWidth": 70,  # ✅ Ensures all columns have minWidth=50
             "resizable": True,
             "sortable": True,
-            "filter": True
+            "filter": "agNumberColumnFilter" if col in numeric_columns else "agTextColumnFilter"
         }
-        for col in valid_columns
+        for col in table_columns(log_enabled)
     ]
 
-    return columnDefs, rowData, str(log_enabled)  # ✅ `key` ensures AgGrid refreshes properly
+    # ✅ Rows arrive through update_table_rows (infinite) or the snapshot fetch (clientSide)
+    return columnDefs, str(log_enabled)  # ✅ `key` ensures AgGrid refreshes properly
+
+
+# ✅ Serve one block of rows for the infinite row model
+@app.callback(
+    Output("compare-grid", "getRowsResponse"),
+    Input("compare-grid", "getRowsRequest"),
+    State("show-log-values", "value"),
+    prevent_initial_call=True,
+)
+@singleflight.coalesce("update_table_rows", key=lambda rows_request, log_toggle: json.dumps(
+    [rows_request, "show" in (log_toggle or [])], sort_keys=True))
+def update_table_rows(rows_request, log_toggle):
+    if not rows_request:
+        return no_update
+    log_enabled = "show" in (log_toggle or [])
+
+    # ✅ Dataset/array backends, default order: read only the rows behind this block
+    store = get_data().store
+    if store is not None and not rows_request.get("sortModel") and not rows_request.get("filterModel"):
+        start = int(rows_request.get("startRow") or 0)
+        end = int(rows_request.get("endRow") or start)
+        block = store.page(table_columns(log_enabled), start, end)
+        metrics.record_rows(len(block))
+        return grid.rows_response(block, len(store), decimals=2)
+
+    table = table_snapshots.frame(log_enabled)
+    response = grid.get_rows(table, rows_request, frame_key=table_snapshots.etag(log_enabled), decimals=2)
+    metrics.record_rows(len(response["rowData"]))
+    return response
+
+
+# ✅ Client-side row model: the browser fetches the snapshot directly (ETag-cached)
+if config.GRID_ROW_MODEL != "infinite":
+    app.clientside_callback(
+        """
+        async function(log_toggle) {
+            const variant = (log_toggle || []).includes("show") ? "log" : "plain";
+            const response = await fetch("%s" + variant);
+            return await response.json();
+        }
+        """ % app.get_relative_path("/table-snapshot/"),
+        Output("compare-grid", "rowData"),
+        Input("show-log-values", "value"),
+    )
+
+
+
+# ✅ Map values: one vector per year in geometry order, read once per variable and state selection
+@cache.memoize(timeout=3600)
+def map_vectors(variable, states, version):
+    view = read_view(["pc11_district_id", "year", variable], list(states))
+    view = view.assign(position=pd.to_numeric(view["pc11_district_id"].astype(str)).map(geometry_positions))
+    view = view.dropna(subset=["position"])  # Districts without a shape are not drawn
+    wide = view.pivot_table(index="position", columns="year", values=variable, aggfunc="first", dropna=False)
+    values = wide.to_numpy(dtype=np.float64).round(4)
+    finite = values[np.isfinite(values)]
+    return {
+        "locations": wide.index.astype(int).tolist(),
+        "years": {int(y): [None if np.isnan(v) else v for v in values[:, i].tolist()] for i, y in enumerate(wide.columns)},
+        "range": [float(finite.min()), float(finite.max())] if finite.size else None,
+    }
+
+
+@app.callback(
+    Output("map-values", "data"),
+    Input("map-variable-dropdown", "value"),
+    Input("map-year-slider", "value"),
+    Input("map-state-dropdown", "value"),
+)
+def update_map_values(variable, year, selected_states):
+    vectors = map_vectors(variable, tuple(catalog.expand(selected_states or [])), data_version)
+    locations = vectors["locations"]
+    return {
+        "variable": variable,
+        "label": variable.replace("_", " ").title(),
+        "year": year,
+        "locations": locations,
+        "values": vectors["years"].get(int(year), [None] * len(locations)),
+        "range": vectors["range"],
+    }
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="map", function_name="render"),
+    Output("map-graph", "figure"),
+    Input("map-values", "data"),
+    Input("map-graph", "relayoutData"),
+    State("map-geometry", "data"),
+)
+
+
+# ✅ TopoJSON per resolution; the URL carries the geometry version, so browsers keep it
+@server.route("/geometry/<level>.topo.json")
+def geometry_file(level):
+    if geometry_index is None or level not in geometry_index["levels"]:
+        abort(404)
+    current = request.args.get("v") == geometry_index["version"]
+    return send_file(geometry_path / f"districts-{level}.topo.json", mimetype="application/json",
+                     conditional=True, etag=True, max_age=365 * 24 * 3600 if current else 0)
+
+
+# ✅ Streaming exports: /export/table.<fmt> (current sort/filter, rounded like the grid) and
+# /export/explore.<fmt> (district rows of the explore selection). Rows go out batch by batch
+# with chunked transfer, so the full selection is never serialized in one piece.
+def table_export_batches(log_enabled, sort_model, filter_model):
+    columns = table_columns(log_enabled)
+    store = get_data().store
+    if store is not None and not sort_model and not filter_model:
+        return rounded(store.batches(columns), 2), widened(store.schema(columns))  # Same rows as store.page
+    table = table_snapshots.frame(log_enabled)
+    positions = None
+    if sort_model or filter_model:
+        positions = grid.row_order(table, table_snapshots.etag(log_enabled), sort_model, filter_model)
+    return frame_batches(table, columns, positions), frame_schema(table, columns)
+
+
+def explore_export_batches(log_enabled, selected_states, selected_districts):
+    columns = table_columns(log_enabled)
+    states, districts = normalize_explore_selection(selected_states, selected_districts)
+    data = get_data()
+    # Rounded in float64 like the table, so every backend and dtype mode writes the same values
+    if data.store is not None:
+        return rounded(data.store.batches(columns, states, districts), 2), widened(data.store.schema(columns))
+    # In-memory rows: the selection's blocks, reordered like the table (newest year first)
+    ranges = sorted(data.index.ranges(states, districts))
+    positions = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.array([], dtype=np.int64)
+    years = data.frame["year"].to_numpy()[positions]
+    positions = positions[np.argsort(-years.astype(np.float64), kind="stable")]
+    return rounded(frame_batches(data.frame, columns, positions), 2), widened(frame_schema(data.frame, columns))
+
+
+def _json_arg(name):
+    try:
+        return json.loads(request.args.get(name) or "null")
+    except ValueError:
+        abort(400)
+
+
+@server.route("/export/<source>.<fmt>")
+def export_rows(source, fmt):
+    if fmt not in EXPORT_FORMATS or source not in ("table", "explore"):
+        abort(404)
+    log_enabled = request.args.get("log") == "1"
+    if source == "table":
+        batches, schema = table_export_batches(log_enabled, _json_arg("sort"), _json_arg("filter"))
+    else:
+        batches, schema = explore_export_batches(log_enabled, request.args.getlist("states"), request.args.getlist("districts"))
+
+    response = Response(export_chunks(fmt, batches, schema), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="shrug_{source}.{fmt}"'
+    return response
+
+
+# ✅ Download links follow the grid's sort/filter and the explore selection
+app.clientside_callback(
+    ClientsideFunction(namespace="export", function_name="tableLinks"),
+    Output("table-export-csv", "href"),
+    Output("table-export-parquet", "href"),
+    Input("show-log-values", "value"),
+    Input("compare-grid", "getRowsRequest") if config.GRID_ROW_MODEL == "infinite" else State("compare-grid", "columnDefs"),
+)
+app.clientside_callback(
+    ClientsideFunction(namespace="export", function_name="exploreLinks"),
+    Output("explore-export-csv", "href"),
+    Output("explore-export-parquet", "href"),
+    Input("state-dropdown", "value"),
+    Input("district-dropdown", "value"),
+    State("state-district-map", "data"),
+)
+
+
+# ✅ Cold-start report (deferred phases show up in /startup-timings once they have run)
+startup_timings["startup"] = round(time.perf_counter() - startup_start, 3)
+print("⏱️ Cold start: " + ", ".join(f"{label} {seconds:.2f}s" for label, seconds in startup_timings.items())
+      + ("" if "data" in startup_timings else " (data and plotly.express deferred to first use)"))
+
 
+@server.route("/startup-timings")
+def startup_timings_route():
+    return jsonify(startup_timings)
 
 
 # ✅ Run App
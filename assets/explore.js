@@ -0,0 +1,56 @@
+// ✅ Clientside callbacks for the explore tab
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    explore: {
+        // Lazy frames: fetch one year of the explore figure, keeping fetched years in memory
+        showYear: async function (year, x, y, size, states, districts, level, open) {
+            const config = JSON.parse(document.getElementById("_dash-config").textContent);
+            const body = JSON.stringify({x: x, y: y, size: size, states: states, districts: districts, year: year, level: level, open: open});
+            const frames = window.exploreFrames = window.exploreFrames || new Map();
+
+            if (!frames.has(body)) {
+                const response = await fetch(config.requests_pathname_prefix + "explore-frame", {
+                    method: "POST",
+                    headers: {"Content-Type": "application/json"},
+                    body: body,
+                });
+                if (!response.ok) {
+                    return window.dash_clientside.no_update;
+                }
+                frames.set(body, await response.json());
+                if (frames.size > 200) {
+                    frames.delete(frames.keys().next().value);  // Drop the oldest year
+                }
+            }
+            return frames.get(body);
+        },
+
+        // Same expansion as update_district_options in app.py, without the server round trip
+        expandStates: function (selected, mapping) {
+            if (!selected || !selected.length) {
+                return [[], [], []];
+            }
+            const expanded = new Set();
+            selected.forEach(function (value) {
+                (mapping.groups[value] || [value]).forEach(function (state) {
+                    if (state in mapping.districts) {
+                        expanded.add(state);
+                    }
+                });
+            });
+            const states = Array.from(expanded).sort();
+
+            const districts = [];
+            const seen = new Set();
+            states.forEach(function (state) {
+                mapping.districts[state].forEach(function (district) {
+                    if (!seen.has(district)) {
+                        seen.add(district);
+                        districts.push(district);
+                    }
+                });
+            });
+            const options = districts.map(function (d) { return {label: d, value: d}; });
+            return [options, districts, states];
+        },
+    },
+});
@@ -0,0 +1,40 @@
+// ✅ Clientside callbacks for the download links (the rows are streamed by /export in app.py)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    export: {
+        // Table: the log toggle plus the grid's current sort and filter models
+        tableLinks: function (log_toggle, rows_request) {
+            const params = new URLSearchParams();
+            if ((log_toggle || []).includes("show")) {
+                params.set("log", "1");
+            }
+            const request = rows_request && rows_request.sortModel !== undefined ? rows_request : {};
+            if (request.sortModel && request.sortModel.length) {
+                params.set("sort", JSON.stringify(request.sortModel));
+            }
+            if (request.filterModel && Object.keys(request.filterModel).length) {
+                params.set("filter", JSON.stringify(request.filterModel));
+            }
+            return exportLinks("table", params);
+        },
+
+        // Explore: the selected states and, unless every one of their districts is selected, the districts
+        exploreLinks: function (states, districts, mapping) {
+            const params = new URLSearchParams();
+            (states || []).forEach(function (state) { params.append("states", state); });
+            const available = window.dash_clientside.explore.expandStates(states, mapping)[1];
+            const selected = new Set(districts || []);
+            if (selected.size && !available.every(function (d) { return selected.has(d); })) {
+                selected.forEach(function (district) { params.append("districts", district); });
+            }
+            return exportLinks("explore", params);
+        },
+    },
+});
+
+function exportLinks(source, params) {
+    const config = JSON.parse(document.getElementById("_dash-config").textContent);
+    const query = params.toString() ? "?" + params.toString() : "";
+    return ["csv", "parquet"].map(function (fmt) {
+        return config.requests_pathname_prefix + "export/" + source + "." + fmt + query;
+    });
+}
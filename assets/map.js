@@ -0,0 +1,108 @@
+// ✅ Clientside rendering for the map tab: district shapes are fetched once per resolution
+// (TopoJSON written by utils/topology.py), decoded to GeoJSON and kept in memory; a year or
+// variable change only brings a new value vector from update_map_values in app.py
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    map: {
+        render: async function (values, relayout, geometry) {
+            if (!values || !geometry) {
+                return window.dash_clientside.no_update;
+            }
+            const level = mapLevel(geometry.levels, values.locations.length, relayout);
+            const state = window.mapState = window.mapState || {};
+            const triggered = (window.dash_clientside.callback_context.triggered || []).map(function (t) { return t.prop_id; });
+            if (triggered.length && triggered.every(function (id) { return id === "map-graph.relayoutData"; })
+                    && level === state.level) {
+                return window.dash_clientside.no_update;  // Pan or zoom within the same resolution
+            }
+            state.level = level;
+
+            const features = await mapFeatures(geometry, level);
+            const names = values.locations.map(function (i) {
+                const properties = features.byId[i] ? features.byId[i].properties : {};
+                return properties.district + ", " + properties.state;
+            });
+            return {
+                data: [{
+                    type: "choroplethmap",
+                    geojson: features.collection,
+                    locations: values.locations,
+                    z: values.values,
+                    text: names,
+                    zmin: values.range ? values.range[0] : undefined,
+                    zmax: values.range ? values.range[1] : undefined,
+                    colorscale: "Viridis",
+                    marker: {line: {width: 0.3, color: "white"}},
+                    colorbar: {title: {text: values.label}},
+                    hovertemplate: "%{text}<br>%{z:.3f}<extra></extra>",
+                }],
+                layout: {
+                    title: {text: values.label + " (" + values.year + ")"},
+                    map: {style: "white-bg", center: {lat: 22.5, lon: 82.5}, zoom: 3.4},
+                    margin: {l: 0, r: 0, t: 40, b: 0},
+                    height: 650,
+                    uirevision: "map",  // Keep the user's pan and zoom across years
+                    meta: {resolution: level},
+                },
+            };
+        },
+    },
+});
+
+// Coarse shapes for many districts, finer ones for a few or when zoomed in
+function mapLevel(levels, count, relayout) {
+    let index = count > 300 ? 0 : count > 60 ? 1 : 2;
+    const zoom = relayout && relayout["map.zoom"];
+    if (zoom) {
+        index += zoom >= 7 ? 2 : zoom >= 5 ? 1 : 0;
+    }
+    return levels[Math.min(index, levels.length - 1)];
+}
+
+async function mapFeatures(geometry, level) {
+    const key = level + ":" + geometry.version;
+    const cache = window.mapGeometry = window.mapGeometry || new Map();
+    if (!cache.has(key)) {
+        cache.set(key, fetch(geometry.url + level + ".topo.json?v=" + geometry.version)
+            .then(function (response) { return response.json(); })
+            .then(function (topology) { return decodeTopology(topology, "districts"); }));
+    }
+    return await cache.get(key);
+}
+
+// TopoJSON -> GeoJSON: delta-decoded, dequantized arcs stitched into rings (same as decode_topology)
+function decodeTopology(topology, objectName) {
+    const scale = topology.transform.scale;
+    const translate = topology.transform.translate;
+    const arcs = topology.arcs.map(function (arc) {
+        let x = 0, y = 0;
+        return arc.map(function (delta) {
+            x += delta[0];
+            y += delta[1];
+            return [x * scale[0] + translate[0], y * scale[1] + translate[1]];
+        });
+    });
+
+    function ring(indexes) {
+        const points = [];
+        indexes.forEach(function (i) {
+            const arc = i >= 0 ? arcs[i] : arcs[~i].slice().reverse();
+            (points.length ? arc.slice(1) : arc).forEach(function (p) { points.push(p); });
+        });
+        return points;
+    }
+
+    const features = [];
+    const byId = {};
+    topology.objects[objectName].geometries.forEach(function (object) {
+        if (!object.type) {
+            return;
+        }
+        const coordinates = object.type === "Polygon"
+            ? object.arcs.map(ring)
+            : object.arcs.map(function (polygon) { return polygon.map(ring); });
+        const feature = {type: "Feature", id: object.id, properties: object.properties, geometry: {type: object.type, coordinates: coordinates}};
+        features.push(feature);
+        byId[object.id] = feature;
+    });
+    return {collection: {type: "FeatureCollection", features: features}, byId: byId};
+}
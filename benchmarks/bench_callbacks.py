@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the parent directory to sys.path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+benchmarks_folder = Path(__file__).resolve().parent
+results_folder = benchmarks_folder / "results"
+baseline_path = benchmarks_folder / "baseline.json"
+
+
+# ✅ Benchmarks for the Dash callbacks, called directly (no browser, no HTTP).
+# Each dataset runs in its own process so load time and memory are measured from a clean
+# start: scale 1 is the real final_data.parquet, 10/100/1000 are synthetic (see synthetic.py).
+# Every case reports the first (cold) call, the median of the repeats (warm), the peak RSS
+# growth during the cold call and the serialized payload size.
+
+EXPLORE_DEFAULT = ("forest_cover", "log_nightlights", "pm25")
+EXPLORE_LOG = ("log_forest_cover", "log_nightlights", "log_pm25")
+REGRESSION_RATIO = 1.25  # Flag cases more than 25% slower than the baseline
+
+
+def benchmark_cases(app):
+    # app=None only lists the case names
+    block = {"startRow": 0, "endRow": app.config.GRID_BLOCK_SIZE if app else 0}
+    return [
+        ("update_district_options", "default", lambda: app.update_district_options(["High-pop"])),
+        ("update_district_options", "All-states", lambda: app.update_district_options(["All-states"])),
+        ("update_explore_graph", "default", lambda: app.update_explore_graph(*EXPLORE_DEFAULT, ["High-pop"], None)),
+        ("update_explore_graph", "All-states", lambda: app.update_explore_graph(*EXPLORE_DEFAULT, ["All-states"], None)),
+        ("update_explore_graph", "All-states log columns", lambda: app.update_explore_graph(*EXPLORE_LOG, ["All-states"], None)),
+        ("update_explore_graph", "All-states state cubes", lambda: app.update_explore_graph(*EXPLORE_DEFAULT, ["All-states"], None, "state", [])),
+        ("update_explore_graph", "state cubes, 1 expanded", lambda: app.update_explore_graph(*EXPLORE_DEFAULT, ["All-states"], None, "state", ["Bihar"])),
+        ("update_table", "default", lambda: app.update_table([])),
+        ("update_table", "log columns", lambda: app.update_table(["show"])),
+        ("update_table_rows", "default", lambda: app.update_table_rows(block, [])),
+        ("update_table_rows", "log columns", lambda: app.update_table_rows(block, ["show"])),
+        ("update_table_rows", "sorted + filtered", lambda: app.update_table_rows(
+            dict(block, sortModel=[{"colId": "pm25", "sort": "desc"}],
+                 filterModel={"state": {"filterType": "text", "type": "contains", "filter": "pradesh"}}), [])),
+        ("table snapshot", "log columns", lambda: app.table_snapshots.get(True).body),
+        ("update_map_values", "All-states", lambda: app.update_map_values("pm25", 2010, ["All-states"])),
+    ]
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+class PeakRSS:
+    # Samples RSS on a background thread; also sees memory pyarrow allocates outside tracemalloc
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0.0
+
+    def _sample(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, rss_mb())
+            self._done.wait(self.interval)
+
+    def __enter__(self):
+        self.start = rss_mb()
+        self.peak = self.start
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb())
+        self.growth = self.peak - self.start
+
+
+def payload_bytes(result):
+    if isinstance(result, bytes):
+        return len(result)
+    from plotly.io.json import to_json_plotly  # Same encoder Dash uses for callback responses
+    return len(to_json_plotly(result).encode("utf-8"))
+
+
+def run_worker(scale, repeat, output, first_case=0):
+    # Appends one JSON line per finished case, so a case that gets the worker killed (out of
+    # memory at 1000x) only loses itself; the runner restarts after it
+    started = time.perf_counter()
+    import app
+    import_s = time.perf_counter() - started
+
+    with PeakRSS() as load_rss:
+        started = time.perf_counter()
+        data = app.get_data()
+        app.plotly_express()
+        load_s = time.perf_counter() - started
+    rows = len(data.store) if data.store is not None else len(data.frame)
+
+    with open(output, "a") as out:
+        out.write(json.dumps({
+            "rows": rows,
+            "backend": app.config.DATA_BACKEND,
+            "import_s": round(import_s, 3),
+            "load_s": round(load_s, 3),
+            "load_peak_mb": round(load_rss.growth, 1),
+        }) + "\n")
+        out.flush()
+
+        for callback, case, func in benchmark_cases(app)[first_case:]:
+            with PeakRSS() as peak:
+                started = time.perf_counter()
+                result = func()
+                cold_s = time.perf_counter() - started
+            warm = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                warm.append(time.perf_counter() - started)
+            out.write(json.dumps({
+                "callback": callback,
+                "case": case,
+                "cold_s": round(cold_s, 4),
+                "warm_s": round(statistics.median(warm), 4) if warm else None,
+                "peak_mb": round(peak.growth, 1),
+                "payload_bytes": payload_bytes(result),
+                "rss_mb": round(rss_mb(), 1),
+            }) + "\n")
+            out.flush()
+            print(f"  {callback:<24} {case:<24} {cold_s:8.3f}s", file=sys.stderr)
+
+
+def run_scale(scale, repeat):
+    from benchmarks.synthetic import make_dataset
+
+    env = dict(os.environ, FIGURE_CACHE_WARM="0", FIGURE_CACHE_MAX_BYTES="0")  # Every explore call builds
+    if scale != 1:
+        env["CLEAN_DATA_FOLDER"] = str(make_dataset(scale))
+
+    case_names = [(callback, case) for callback, case, _ in benchmark_cases(None)]
+    run = {"scale": scale, "cases": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        env["CACHE_FOLDER"] = tmp  # Fresh snapshot cache, so the first table call is cold
+        print(f"⏱️ Benchmarking {scale}x ...", file=sys.stderr)
+        while len(run["cases"]) < len(case_names):
+            output = Path(tmp) / f"result-{len(run['cases'])}.jsonl"
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", "--scale", str(scale), "--repeat", str(repeat),
+                 "--output", str(output), "--first-case", str(len(run["cases"]))],
+                env=env, cwd=project_root, stdout=subprocess.PIPE, text=True,
+            )
+            lines = [json.loads(line) for line in output.read_text().splitlines()] if output.exists() else []
+            if not lines:
+                print(proc.stdout[-2000:], file=sys.stderr)
+                run["error"] = f"worker exited with {proc.returncode} while loading the data"
+                break
+            run.update(lines[0])
+            run["cases"].extend(lines[1:])
+            if proc.returncode != 0 and len(run["cases"]) < len(case_names):
+                callback, case = case_names[len(run["cases"])]
+                print(f"  ❌ {callback} {case}: worker exited with {proc.returncode}", file=sys.stderr)
+                run["cases"].append({"callback": callback, "case": case, "error": f"worker exited with {proc.returncode}"})
+    if run["cases"]:
+        run["rss_mb"] = max(c.get("rss_mb", 0) for c in run["cases"])
+    return run
+
+
+def git_revision():
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def print_report(results, baseline=None):
+    baseline_cases = {}
+    for run in (baseline or {}).get("runs", []):
+        for c in run.get("cases", []):
+            baseline_cases[(run["scale"], run.get("backend"), c["callback"], c["case"])] = c
+
+    for run in results["runs"]:
+        if "rows" not in run:
+            print(f"\n❌ {run['scale']}x: {run['error']}")
+            continue
+        print(f"\n📊 {run['scale']}x ({run['rows']:,} rows, {run['backend']}): import {run['import_s']:.2f}s, "
+              f"load {run['load_s']:.2f}s (+{run['load_peak_mb']:.0f} MB), RSS {run['rss_mb']:.0f} MB")
+        print(f"  {'callback':<24} {'case':<24} {'cold s':>8} {'warm s':>8} {'peak MB':>8} {'payload KB':>11} {'vs base':>8}")
+        for c in run["cases"]:
+            if "error" in c:
+                print(f"  {c['callback']:<24} {c['case']:<24} ❌ {c['error']}")
+                continue
+            base = baseline_cases.get((run["scale"], run["backend"], c["callback"], c["case"]))
+            ratio = ""
+            if base and base.get("warm_s") and c["warm_s"] is not None:
+                value = c["warm_s"] / base["warm_s"]
+                ratio = f"{value:.2f}x" + (" ⚠️" if value > REGRESSION_RATIO else "")
+            warm = f"{c['warm_s']:8.3f}" if c["warm_s"] is not None else f"{'-':>8}"
+            print(f"  {c['callback']:<24} {c['case']:<24} {c['cold_s']:8.3f} {warm} {c['peak_mb']:8.1f} "
+                  f"{c['payload_bytes'] / 1e3:11.1f} {ratio:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Dash callbacks on real and synthetic scaled-up data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="1 is the real dataset; larger values (e.g. 1000) are synthetic multiples of the district count.")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm calls per case after the cold one.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"Store these runs in {baseline_path.name}, replacing runs of the same scale and backend.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("--first-case", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.scale, args.repeat, args.output, args.first_case)
+        sys.exit(0)
+
+    results = {
+        "revision": git_revision(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "runs": [run_scale(scale, args.repeat) for scale in args.scales],
+    }
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    print_report(results, baseline)
+    if baseline:
+        print(f"\n(vs base: warm time relative to {baseline_path.name} from {baseline['revision']})")
+
+    results_folder.mkdir(exist_ok=True)
+    result_path = results_folder / f"{results['created'][:19].replace(':', '')}-{results['revision']}.json"
+    result_path.write_text(json.dumps(results, indent=1))
+    print(f"💾 Results saved to {result_path}")
+    if args.save_baseline:
+        saved = {(run["scale"], run.get("backend")) for run in results["runs"]}
+        kept = [run for run in (baseline or {}).get("runs", []) if (run["scale"], run.get("backend")) not in saved]
+        baseline_path.write_text(json.dumps(dict(results, runs=kept + results["runs"]), indent=1))
+        print(f"💾 Baseline saved to {baseline_path}")
@@ -0,0 +1,347 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# Add the parent directory to sys.path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+benchmarks_folder = Path(__file__).resolve().parent
+results_folder = benchmarks_folder / "results"
+
+
+# ✅ Load test: app.py under gunicorn, driven over HTTP by N virtual users. Each user replays
+# visitor sessions (table page, log toggle, sort, tab switch, state group, variable changes)
+# against /_dash-update-component with the same request bodies the Dash renderer sends, and
+# the report gives throughput and p50/p95/p99 latency per callback plus the server's peak RSS.
+# The client runs on the same machine, so on small hosts it takes some CPU from the server.
+
+# Callback name -> the output it is registered under (looked up in /_dash-dependencies)
+CALLBACK_OUTPUTS = {
+    "update_main_tab": "tabs-content.children",
+    "update_table": "compare-grid.columnDefs",
+    "update_table_rows": "compare-grid.getRowsResponse",
+    "update_explore_graph": "explore-graph.figure",
+    "update_district_options": "district-dropdown.data",
+}
+
+# Component values after the page loads (the layout defaults in app.py)
+INITIAL_STATE = {
+    "main-tabs.value": "compare",
+    "show-log-values.value": [],
+    "x-variable-dropdown.value": "forest_cover",
+    "y-variable-dropdown.value": "log_nightlights",
+    "size-variable-dropdown.value": "pm25",
+    "state-dropdown.value": ["High-pop"],
+    "explore-level.value": "district",
+    "explore-open-states.data": [],
+    "explore-year-slider.value": 2001,
+}
+
+STATE_GROUPS = ["High-pop", "All-states", "Large-states", "Medium-pop", "Low-pop"]
+VARIABLES = ["nightlights", "log_nightlights", "forest_cover", "log_forest_cover", "pm25", "log_pm25", "log_pop11"]
+SORT_COLUMNS = ["pm25", "nightlights", "forest_cover", "district"]
+
+
+def grid_block(start, block_size=100, **models):
+    return dict({"startRow": start, "endRow": start + block_size, "sortModel": [], "filterModel": {}}, **models)
+
+
+def session_script(metadata, rng):
+    # One visitor as a list of (callback, changed component values); the rest of the inputs
+    # keep their current values, as in the browser
+    def districts(group):
+        states = sorted({s for s in metadata["groups"].get(group, [group]) if s in metadata["districts"]})
+        return list(dict.fromkeys(d for s in states for d in metadata["districts"][s]))
+
+    group = rng.choice(STATE_GROUPS)
+    sort = {"sortModel": [{"colId": rng.choice(SORT_COLUMNS), "sort": rng.choice(["asc", "desc"])}]}
+    return [
+        ("update_main_tab", {"main-tabs.value": "compare"}),
+        ("update_table", {"show-log-values.value": []}),
+        ("update_table_rows", {"compare-grid.getRowsRequest": grid_block(0)}),
+        ("update_table_rows", {"compare-grid.getRowsRequest": grid_block(100)}),
+        ("update_table", {"show-log-values.value": ["show"]}),
+        ("update_table_rows", {"compare-grid.getRowsRequest": grid_block(0)}),
+        ("update_table_rows", {"compare-grid.getRowsRequest": grid_block(0, **sort)}),
+        ("update_main_tab", {"main-tabs.value": "explore"}),
+        ("update_explore_graph", {"district-dropdown.value": districts("High-pop")}),
+        ("update_explore_graph", {"state-dropdown.value": [group], "district-dropdown.value": districts(group)}),
+        ("update_explore_graph", {"y-variable-dropdown.value": rng.choice(VARIABLES)}),
+        ("update_explore_graph", {"size-variable-dropdown.value": rng.choice(VARIABLES + [None])}),
+    ]
+
+
+def parse_outputs(output):
+    # "..a.b...c.d.." (multi-output) or "a.b" -> Dash's outputs field
+    def split(spec):
+        component, prop = spec.rsplit(".", 1)
+        return {"id": component, "property": prop}
+    if output.startswith(".."):
+        return [split(spec) for spec in output[2:-2].split("...")]
+    return split(output)
+
+
+class Callbacks:
+    def __init__(self, dependencies):
+        self.specs = {}
+        for name, key in CALLBACK_OUTPUTS.items():
+            for dep in dependencies:
+                if key in dep["output"] and not dep.get("clientside_function"):
+                    self.specs[name] = dep
+
+    def request_body(self, name, state, changed):
+        dep = self.specs[name]
+        fill = lambda items: [dict(item, value=state.get(f"{item['id']}.{item['property']}")) for item in items]
+        inputs = fill(dep["inputs"])
+        return {
+            "output": dep["output"],
+            "outputs": parse_outputs(dep["output"]),
+            "inputs": inputs,
+            "state": fill(dep["state"]),
+            "changedPropIds": list(changed) or [f"{inputs[0]['id']}.{inputs[0]['property']}"],
+        }
+
+
+class Client:
+    # One keep-alive connection per virtual user
+    def __init__(self, base_url, timeout=130):  # Just above gunicorn's worker timeout
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in range(2):  # Reconnect once if the server closed the idle connection
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, self.prefix + path, body=data, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+
+def call_callback(client, body):
+    # Background callbacks (BACKGROUND_CALLBACKS=1) answer with a job; poll until the result is in
+    status, payload = client.request("POST", "/_dash-update-component", body)
+    nbytes = len(payload)
+    job = json.loads(payload) if status == 200 and payload.startswith(b'{"cacheKey"') else None
+    while job is not None:
+        time.sleep(0.1)
+        status, payload = client.request("POST", f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}", body)
+        nbytes += len(payload)
+        if status != 200 or b'"response"' in payload:
+            job = None
+    return status, nbytes
+
+
+def run_user(base_url, callbacks, metadata, until, think, seed, records):
+    rng = random.Random(seed)
+    client = Client(base_url)
+    while time.time() < until:
+        state = dict(INITIAL_STATE)
+        for name, path in [("page load", "/"), ("_dash-layout", "/_dash-layout"), ("_dash-dependencies", "/_dash-dependencies")]:
+            start = time.time()
+            try:
+                status, payload = client.request("GET", path)
+            except OSError:
+                status, payload = 0, b""
+            records.append((name, start, time.time() - start, status, len(payload)))
+        for name, changes in session_script(metadata, rng):
+            if time.time() >= until:
+                return
+            if name not in callbacks.specs:
+                continue
+            state.update(changes)
+            body = callbacks.request_body(name, state, changes)
+            start = time.time()
+            try:
+                status, nbytes = call_callback(client, body)
+            except OSError:
+                status, nbytes = 0, 0
+            records.append((name, start, time.time() - start, status, nbytes))
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+
+
+def process_rss_mb(pid):
+    # RSS of a process and all its descendants (the gunicorn master and its workers)
+    children = defaultdict(list)
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children[int(fields[1])].append(int(stat.parent.name))
+    total, todo = 0, [pid]
+    while todo:
+        current = todo.pop()
+        try:
+            total += int(Path(f"/proc/{current}/statm").read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError):
+            pass
+        todo.extend(children.get(current, []))
+    return total / 1e6
+
+
+def start_server(port, workers, threads, env, log_path, timeout=300):
+    command = [sys.executable, "-m", "gunicorn", "app:server", "--config", "gunicorn.conf.py",
+               "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads)]
+    log = open(log_path, "w")
+    proc = subprocess.Popen(command, cwd=project_root, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    client = Client(f"http://127.0.0.1:{port}")
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}, see {log_path}")
+        try:
+            if client.request("GET", "/_dash-layout")[0] == 200:
+                return proc
+        except OSError:
+            time.sleep(0.5)
+    stop_server(proc)
+    raise RuntimeError(f"gunicorn did not answer within {timeout}s, see {log_path}")
+
+
+def stop_server(proc):
+    # The master and its workers share a process group; stuck workers are killed after 30s
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def summarize(records, started, finished):
+    by_name = defaultdict(list)
+    for name, start, seconds, status, nbytes in records:
+        by_name[name].append((seconds, status, nbytes))
+    elapsed = finished - started
+    rows = {}
+    for name, items in by_name.items():
+        latencies = np.array([s for s, status, _ in items if status == 200])
+        rows[name] = {
+            "requests": len(items),
+            "errors": sum(status != 200 for _, status, _ in items),
+            "per_s": len(items) / elapsed,
+            "p50_s": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p95_s": float(np.percentile(latencies, 95)) if len(latencies) else None,
+            "p99_s": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "max_s": float(latencies.max()) if len(latencies) else None,
+            "mean_kb": float(np.mean([b for _, _, b in items]) / 1e3),
+        }
+    return {"elapsed_s": elapsed, "requests": len(records), "per_s": len(records) / elapsed, "callbacks": rows}
+
+
+def print_report(result):
+    summary = result["summary"]
+    settings = result["settings"]
+    print(f"\n📊 {settings['users']} users, {settings['workers']} workers x {settings['threads']} threads, "
+          f"scale {settings['scale']}, {summary['elapsed_s']:.0f}s measured: {summary['requests']:,} requests, "
+          f"{summary['per_s']:.1f} req/s, server peak RSS {result.get('peak_rss_mb', 0):.0f} MB")
+    print(f"  {'callback':<24} {'requests':>9} {'errors':>7} {'req/s':>7} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8} {'KB':>9}")
+    fmt = lambda value: f"{value:8.3f}" if value is not None else f"{'-':>8}"
+    for name, row in sorted(summary["callbacks"].items(), key=lambda item: -item[1]["requests"]):
+        print(f"  {name:<24} {row['requests']:9,} {row['errors']:7,} {row['per_s']:7.2f} {fmt(row['p50_s'])} "
+              f"{fmt(row['p95_s'])} {fmt(row['p99_s'])} {fmt(row['max_s'])} {row['mean_kb']:9.1f}")
+
+
+def git_revision():
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the dashboard under gunicorn with concurrent replayed sessions.")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=10, help="Seconds of load before measuring.")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean think time between a user's steps (0 = back to back).")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes.")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per worker (more than 1 uses gthread workers).")
+    parser.add_argument("--scale", type=int, default=1, help="1 is the real dataset; larger values use synthetic.py datasets.")
+    parser.add_argument("--port", type=int, default=8060)
+    parser.add_argument("--url", help="Test an already running server instead of starting gunicorn.")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the server, e.g. --env DATA_BACKEND=mmap (repeatable).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))  # Still stops gunicorn (finally below)
+    from config import clean_data_folder
+    data_folder = clean_data_folder
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers), **dict(item.split("=", 1) for item in args.env))
+    if args.scale != 1:
+        from benchmarks.synthetic import make_dataset
+        data_folder = make_dataset(args.scale)
+        env["CLEAN_DATA_FOLDER"] = str(data_folder)
+    metadata = json.loads((data_folder / "final_data.meta.json").read_text(encoding="utf-8"))
+
+    results_folder.mkdir(exist_ok=True)
+    created = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    server = None
+    base_url = args.url
+    if base_url is None:
+        log_path = results_folder / f"load-{created[:19].replace(':', '')}-gunicorn.log"
+        print(f"🚀 Starting gunicorn ({args.workers} workers x {args.threads} threads) on port {args.port} ...", file=sys.stderr)
+        server = start_server(args.port, args.workers, args.threads, env, log_path)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        status, payload = Client(base_url).request("GET", "/_dash-dependencies")
+        callbacks = Callbacks(json.loads(payload))
+
+        # Warm-up and measured load come from the same users; only requests started after the warm-up count
+        records = []
+        peak_rss = [0.0]
+        measure_from = time.time() + args.warmup
+        until = measure_from + args.duration
+        users = [threading.Thread(target=run_user, args=(base_url, callbacks, metadata, until, args.think, args.seed + i, records), daemon=True)
+                 for i in range(args.users)]
+        print(f"⏱️ {args.users} users: {args.warmup:.0f}s warm-up, then {args.duration:.0f}s measured ...", file=sys.stderr)
+        for user in users:
+            user.start()
+        while any(user.is_alive() for user in users):
+            if server is not None:
+                peak_rss[0] = max(peak_rss[0], process_rss_mb(server.pid))
+            time.sleep(0.5)
+        finished = time.time()
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    measured = [r for r in records if r[1] >= measure_from]
+    result = {
+        "revision": git_revision(),
+        "created": created,
+        "settings": dict(vars(args), env=args.env),
+        "peak_rss_mb": peak_rss[0],
+        "summary": summarize(measured, measure_from, min(finished, until) if measured else finished),
+    }
+    print_report(result)
+    result_path = results_folder / f"load-{created[:19].replace(':', '')}-{result['revision']}.json"
+    result_path.write_text(json.dumps(result, indent=1))
+    print(f"💾 Results saved to {result_path}")
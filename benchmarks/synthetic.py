@@ -0,0 +1,88 @@
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Add the parent directory to sys.path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from config import cache_folder, clean_data_folder
+
+
+# ✅ Synthetic scale-up of final_data.parquet with the same schema.
+# Each copy k > 0 of a district gets a new name ("Patna #k") and pc11 id (id + 1000k), per-district noise on
+# area/pop11 and per-row noise on the yearly measures; log columns are recomputed like prep_data.py.
+# Stands in for sub-district/village SHRUG data at 10x, 100x, 1000x the district count.
+
+bench_data_folder = cache_folder / "bench"
+STATIC_MEASURES = ["area", "pop11"]
+YEARLY_MEASURES = ["nightlights", "forest_cover", "pm25"]
+
+
+def scaled_copy(df, k, rng):
+    part = df.copy()
+    if k == 0:
+        return part  # Copy 0 is the real data
+
+    part["district"] = part["district"] + f" #{k}"
+    ids = part["pc11_district_id"].astype(int) + k * 1000  # Still numeric strings, like the real ids
+    part["pc11_district_id"] = ids.astype(str).str.zfill(3)
+
+    district_codes = part["pc11_district_id"].astype("category").cat.codes.to_numpy()
+    for col in STATIC_MEASURES:
+        factor = rng.lognormal(0.0, 0.2, district_codes.max() + 1)  # Constant across years
+        part[col] = part[col] * factor[district_codes]
+    for col in YEARLY_MEASURES:
+        part[col] = part[col] * rng.lognormal(0.0, 0.1, len(part))
+    part["forest_cover"] = part["forest_cover"].clip(upper=100)
+
+    part["log_area"] = np.log(part["area"])
+    part["log_pop11"] = np.log(part["pop11"])
+    for col in YEARLY_MEASURES:
+        part[f"log_{col}"] = np.log1p(part[col])
+    return part
+
+
+def make_dataset(scale, source=None, seed=0):
+    # Streams the copies into one parquet file, then lets prep_data.py derive the other outputs
+    source = Path(source or clean_data_folder / "final_data.parquet")
+    folder = bench_data_folder / f"x{scale}"
+    target = folder / "final_data.parquet"
+    outputs = [folder / "final_data.meta.json", folder / "cubes" / "state.parquet"]  # Written last by prep_data.py
+    if all(path.exists() for path in outputs):
+        return folder
+
+    if not (folder / "final_data.meta.json").exists():
+        folder.mkdir(parents=True, exist_ok=True)
+        df = pd.read_parquet(source)
+        rng = np.random.default_rng(seed)
+        schema = pa.Table.from_pandas(df, preserve_index=False).schema
+
+        print(f"🧪 Writing {scale}x synthetic dataset ({scale * len(df):,} rows) to {target}")
+        with pq.ParquetWriter(target, schema) as writer:
+            for k in range(scale):
+                table = pa.Table.from_pandas(scaled_copy(df, k, rng), schema=schema, preserve_index=False)
+                writer.write_table(table)
+
+    subprocess.run(
+        [sys.executable, str(project_root / "utils" / "prep_data.py"), "--outputs-only"],
+        env={**os.environ, "CLEAN_DATA_FOLDER": str(folder)},
+        check=True,
+    )
+    return folder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate scaled-up copies of final_data.parquet for benchmarking.")
+    parser.add_argument("scales", type=int, nargs="+", help="District-count multipliers, e.g. 10 100 1000.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for scale in args.scales:
+        print(f"✅ {make_dataset(scale, seed=args.seed)}")
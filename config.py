@@ -14,9 +14,11 @@ data_folder = project_root / "data"
 utils_folder = project_root / "utils"
 log_file = project_root / "logs" / "app.log"
 output_folder = project_root / "Output"  # ✅ Add Output folder
+clean_data_folder = Path(os.environ.get("CLEAN_DATA_FOLDER", data_folder / "clean"))  # ✅ Overridable for benchmark datasets
+cache_folder = Path(os.environ.get("CACHE_FOLDER", data_folder / "cache"))  # ✅ Derived artifacts shared across workers
 
 # ✅ Ensure necessary folders exist
-for folder in [data_folder, utils_folder, project_root / "logs", output_folder]:
+for folder in [data_folder, utils_folder, project_root / "logs", output_folder, clean_data_folder, cache_folder]:
     folder.mkdir(parents=True, exist_ok=True)
 
 print(f"✅ Project root: {project_root}")
@@ -25,4 +27,58 @@ print(f"📂 Output folder: {output_folder}")
 print(f"📄 Log file: {log_file}")
 
 
-DEFAULT_YEAR = 2001
\ No newline at end of file
+DEFAULT_YEAR = 2001
+
+# ✅ Compare grid: "infinite" pages rows from the server, "clientSide" ships the whole table
+GRID_ROW_MODEL = os.environ.get("GRID_ROW_MODEL", "infinite")
+GRID_PAGE_SIZE = 10
+GRID_BLOCK_SIZE = 100  # Rows fetched per getRowsRequest block
+
+# ✅ Low-RAM tier: categorical strings, integer ids and float32 measures
+COMPACT_MEMORY = os.environ.get("COMPACT_MEMORY", "1") == "1"
+
+# ✅ Explore figure cache (LRU under a byte budget, defaults pre-rendered at startup)
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+FIGURE_CACHE_WARM = os.environ.get("FIGURE_CACHE_WARM", "1") == "1"
+# Set by gunicorn.conf.py when the app is preloaded: the warm-up then starts in each worker
+# (post_fork) instead of in the master, whose caches no worker would see
+WARM_AFTER_FORK = os.environ.get("WARM_AFTER_FORK", "0") == "1"
+
+# ✅ Explore rendering: SVG up to EXPLORE_WEBGL_THRESHOLD points per frame, WebGL up to
+# EXPLORE_DENSITY_THRESHOLD, then a binned density heatmap per year
+EXPLORE_WEBGL_THRESHOLD = int(os.environ.get("EXPLORE_WEBGL_THRESHOLD", 500))
+EXPLORE_DENSITY_THRESHOLD = int(os.environ.get("EXPLORE_DENSITY_THRESHOLD", 5000))
+EXPLORE_DENSITY_BINS = 40
+
+# ✅ Explore lazy frames: send one year plus a slider, fetch other years on demand
+EXPLORE_LAZY_FRAMES = os.environ.get("EXPLORE_LAZY_FRAMES", "0") == "1"
+
+# ✅ Expand state groups into districts in the browser instead of a server callback
+CLIENTSIDE_DISTRICT_OPTIONS = os.environ.get("CLIENTSIDE_DISTRICT_OPTIONS", "1") == "1"
+
+# ✅ Data backend: "memory" loads final_data.parquet into every worker, "mmap" maps the
+# pre-sorted final_data.arrow read-only so workers share its pages, "dataset" reads each view
+# from the year-partitioned parquet dataset with column projection and predicate pushdown,
+# "array" holds the rows as a dense [district, year, variable] NumPy array
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "memory")
+
+# ✅ Cold start: build the layout from data/clean/final_data.meta.json and load the rows and
+# Plotly Express on first use; LAZY_DATA=0 loads both at import
+LAZY_DATA = os.environ.get("LAZY_DATA", "1") == "1"
+
+# ✅ Instrumentation: /metrics in Prometheus text format; METRICS_LOG=1 also appends one JSON
+# line per request to log_file
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_LOG = os.environ.get("METRICS_LOG", "0") == "1"
+
+# ✅ Explore level shown first: district (every district), or the pre-aggregated state /
+# area_cat / pop_cat cubes, where clicking a state bubble loads that state's districts
+EXPLORE_LEVEL = os.environ.get("EXPLORE_LEVEL", "district")
+
+# ✅ Background explore renders: update_explore_graph runs in a forked job process managed by
+# Dash's DiskcacheManager (needs `pip install "dash[diskcache]"`, no broker), so the worker
+# keeps serving other callbacks; superseded renders from the same page are killed.
+# Finished figures are kept in cache_folder / "background" under BACKGROUND_CACHE_MAX_BYTES
+BACKGROUND_CALLBACKS = os.environ.get("BACKGROUND_CALLBACKS", "0") == "1"
+BACKGROUND_CACHE_MAX_BYTES = int(os.environ.get("BACKGROUND_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+BACKGROUND_CACHE_EXPIRE = int(os.environ.get("BACKGROUND_CACHE_EXPIRE", 3600))  # Seconds
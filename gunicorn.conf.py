@@ -0,0 +1,22 @@
+import os
+import sys
+
+# ✅ Gunicorn settings (picked up automatically by `gunicorn app:server`)
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+timeout = 120
+
+# ✅ Import app.py once in the master and fork the workers from it. The imported modules,
+# config, metadata and layout are shared copy-on-write (with DATA_BACKEND=mmap the mapped
+# Arrow pages are shared either way). The rows and Plotly Express stay lazy, so each worker
+# loads them on first use unless LAZY_DATA=0 or BACKGROUND_CALLBACKS=1 loads them before the fork.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+if preload_app:
+    os.environ["WARM_AFTER_FORK"] = "1"  # Read by config.py when the master imports the app
+
+
+def post_fork(server, worker):
+    # ✅ The figure cache warm-up runs in the workers that serve requests, not in the master
+    app = sys.modules.get("app")
+    if preload_app and app is not None:
+        app.start_figure_cache_warmup()
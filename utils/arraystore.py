@@ -0,0 +1,193 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Add the parent directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.datastore import DIMENSION_COLUMNS
+from utils.index import DistrictIndex
+
+
+# ✅ Dense in-memory store: every numeric measure lives in one NumPy array indexed by
+# [district_code, year_offset, variable], and the per-district attributes (state, district,
+# categories, ids) in a side table with one row per district. District codes follow
+# (state, district) order, so a state is a contiguous code range and a selection is a set of
+# code ranges; no string column is repeated per year and no row filtering goes through pandas.
+
+class ArrayStore:
+    def __init__(self, values, present, years, variables, dtypes, districts, columns, year_dtype):
+        self.values = values  # float array [district_code, year_offset, variable]
+        self.present = present  # bool [district_code, year_offset]: the (district, year) row exists
+        self.year_values = years
+        self.variables = variables
+        self.dtypes = dtypes  # Original dtype per variable, restored on read
+        self.districts = districts  # Side table, one row per district code
+        self.columns = columns
+        self.year_dtype = year_dtype
+        self._variable_pos = {v: i for i, v in enumerate(variables)}
+        self.index = DistrictIndex(districts, presorted=True)  # Its row ranges are code ranges
+
+    @classmethod
+    def from_frame(cls, df):
+        # Long (district, year) rows -> dense array; rows without a state, district or year are dropped
+        columns = list(df.columns)
+        df = df.dropna(subset=["state", "district", "year"])
+        frame = DistrictIndex(df).frame  # (state, district, year) order
+        attributes = [c for c in columns if c in DIMENSION_COLUMNS or (c != "year" and not pd.api.types.is_numeric_dtype(frame[c]))]
+        variables = [c for c in columns if c != "year" and c not in attributes]
+
+        state_keys = frame["state"].astype(str).to_numpy()
+        district_keys = frame["district"].astype(str).to_numpy()
+        starts = np.flatnonzero(np.concatenate(([True], (state_keys[1:] != state_keys[:-1]) | (district_keys[1:] != district_keys[:-1]))))
+        codes = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(frame))))
+
+        years = np.unique(frame["year"].to_numpy())
+        offsets = np.searchsorted(years, frame["year"].to_numpy())
+        dtype = np.result_type(*[frame[v].dtype for v in variables]) if variables else np.float64
+        dtype = np.float32 if dtype == np.float32 else np.float64
+
+        values = np.full((len(starts), len(years), len(variables)), np.nan, dtype=dtype)
+        values[codes, offsets, :] = frame[variables].to_numpy(dtype=dtype, na_value=np.nan)
+        present = np.zeros((len(starts), len(years)), dtype=bool)
+        present[codes, offsets] = True
+
+        districts = frame.iloc[starts][attributes].reset_index(drop=True)
+        return cls(values, present, years, variables, {v: frame[v].dtype for v in variables},
+                   districts, columns, frame["year"].dtype)
+
+    @classmethod
+    def from_parquet(cls, path):
+        return cls.from_frame(pd.read_parquet(path))
+
+    @property
+    def years(self):
+        return [int(y) for y in self.year_values]
+
+    @property
+    def numeric_columns(self):
+        return {"year", *self.variables} | {c for c in self.districts.columns if pd.api.types.is_numeric_dtype(self.districts[c])}
+
+    def __len__(self):
+        return int(self.present.sum())
+
+    def codes(self, states=None, districts=None):
+        if states is None:
+            return np.arange(len(self.districts))
+        ranges = sorted(self.index.ranges(states, districts))
+        if not ranges:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in ranges])
+
+    def year_offsets(self, years=None):
+        if years is None:
+            return np.arange(len(self.year_values))
+        return np.flatnonzero(np.isin(self.year_values, list(years)))
+
+    def _columns(self, columns, codes, offsets):
+        # Long rows for (codes[i], offsets[i]) pairs, with the original dtypes
+        out = {}
+        for c in columns or self.columns:
+            if c == "year":
+                out[c] = self.year_values[offsets].astype(self.year_dtype)
+            elif c in self._variable_pos:
+                out[c] = pd.Series(self.values[codes, offsets, self._variable_pos[c]]).astype(self.dtypes[c]).to_numpy()
+            elif c in self.districts.columns:
+                out[c] = self.districts[c].iloc[codes].reset_index(drop=True)
+        return pd.DataFrame(out)
+
+    def read(self, columns=None, states=None, districts=None, years=None):
+        # Rows of a selection in (state, district, year) order
+        codes = self.codes(states, districts)
+        offsets = self.year_offsets(years)
+        rows, cols = np.nonzero(self.present[np.ix_(codes, offsets)])  # Row-major: district, then year
+        return self._columns(columns, codes[rows], offsets[cols])
+
+    def read_table(self, columns=None, states=None, districts=None, years=None):
+        return pa.Table.from_pandas(self.read(columns, states, districts, years), preserve_index=False)
+
+    def value_range(self, variable, states=None, districts=None, years=None):
+        # (min, max) of a variable over a selection, straight from the array
+        block = self.values[np.ix_(self.codes(states, districts), self.year_offsets(years), [self._variable_pos[variable]])]
+        if not np.isfinite(block).any():
+            return np.nan, np.nan
+        return float(np.nanmin(block)), float(np.nanmax(block))
+
+    def schema(self, columns):
+        empty = np.array([], dtype=np.int64)
+        return pa.Schema.from_pandas(self._columns(columns, empty, empty), preserve_index=False)
+
+    def batches(self, columns, states=None, districts=None, batch_rows=64 * 1024):
+        # Record batches of a selection in the default table order (newest year first)
+        codes = self.codes(states, districts)
+        for year_offset in range(len(self.year_values) - 1, -1, -1):
+            present = codes[self.present[codes, year_offset]]
+            for start in range(0, len(present), batch_rows):
+                chunk = present[start:start + batch_rows]
+                frame = self._columns(columns, chunk, np.full(len(chunk), year_offset))
+                yield pa.RecordBatch.from_pandas(frame, preserve_index=False)
+
+    def page(self, columns, start, stop):
+        # One block of the default table order: newest year first, then (state, district)
+        rows_codes, rows_offsets, offset = [], [], 0
+        for year_offset in range(len(self.year_values) - 1, -1, -1):
+            codes = np.flatnonzero(self.present[:, year_offset])
+            if offset + len(codes) > start and offset < stop:
+                wanted = codes[max(start - offset, 0):stop - offset]
+                rows_codes.append(wanted)
+                rows_offsets.append(np.full(len(wanted), year_offset))
+            offset += len(codes)
+            if offset >= stop:
+                break
+        if not rows_codes:
+            return self._columns(columns, np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+        return self._columns(columns, np.concatenate(rows_codes), np.concatenate(rows_offsets))
+
+
+# ✅ Equivalence against the pandas path (DistrictIndex slices and the table sort in app.py);
+# run as `python utils/arraystore.py [final_data.parquet]`
+def check_equivalence(df, selections=None):
+    store = ArrayStore.from_frame(df)
+    index = DistrictIndex(df.dropna(subset=["state", "district", "year"]))
+    states = index.states
+    first_state = states[0]
+    selections = selections or [
+        (None, None),
+        (states[: len(states) // 3], None),
+        ([first_state], index.state_districts[first_state][:2]),
+        ([first_state], []),
+    ]
+    year = store.years[len(store.years) // 2]
+    checked = 0
+
+    for selected_states, selected_districts in selections:
+        expected = index.frame if selected_states is None else index.take(selected_states, selected_districts)
+        for years in (None, [year]):
+            want = expected if years is None else expected[expected["year"].isin(years)]
+            got = store.read(list(df.columns), selected_states, selected_districts, years)
+            pd.testing.assert_frame_equal(got, want[list(df.columns)].reset_index(drop=True))
+            for variable in store.variables:
+                lo, hi = store.value_range(variable, selected_states, selected_districts, years)
+                assert np.allclose([lo, hi], [want[variable].min(), want[variable].max()], equal_nan=True), variable
+            checked += 1
+
+    table = index.frame.sort_values(["year", "state", "district"], ascending=[False, True, True], kind="stable").reset_index(drop=True)
+    for start, stop in [(0, 100), (len(table) // 2 - 7, len(table) // 2 + 93), (len(table) - 50, len(table) + 50)]:
+        got = store.page(list(df.columns), start, stop)
+        pd.testing.assert_frame_equal(got, table.iloc[start:stop][list(df.columns)].reset_index(drop=True))
+        checked += 1
+    assert len(store) == len(index.frame)
+    return checked
+
+
+if __name__ == "__main__":
+    from config import clean_data_folder
+    from utils.compact import compact_frame
+
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else clean_data_folder / "final_data.parquet"
+    df = pd.read_parquet(path)
+    for label, frame in [("original dtypes", df), ("compact dtypes", compact_frame(df))]:
+        print(f"✅ ArrayStore matches the pandas path ({label}): {check_equivalence(frame)} selections/pages checked")
@@ -1,7 +1,60 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
 from flask_caching import Cache
-from flask import Flask
 
-app = Flask(__name__)  # Ensure there's a Flask app
-app.config["CACHE_TYPE"] = "SimpleCache"  # Or use "filesystem", "redis", etc.
+cache = Cache(config={"CACHE_TYPE": "SimpleCache"})  # ✅ Bound to the Dash server via cache.init_app(app.server)
+
+
+def digest(values):
+    # Order-independent digest of a collection of strings
+    joined = "\x1f".join(sorted(str(v) for v in values))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+# ✅ LRU cache of serialized figures with a byte budget
+class FigureCache:
+    def __init__(self, app=None, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset_lock)  # A lock held at fork time stays held in the child
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions["figure_cache"] = self
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.stats["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats["hits"] += 1
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return  # Larger than the whole budget; don't flush everything for it
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= len(self._items.pop(key))
+            self._items[key] = body
+            self.nbytes += len(body)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= len(evicted)
+                self.stats["evictions"] += 1
 
-cache = Cache(app)  # Bind cache to the app
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._items), bytes=self.nbytes, max_bytes=self.max_bytes)
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+# ✅ Closed-form OLS for the DMSP -> VIIRS nightlights intercalibration,
+# log(viirs) = alpha + beta * log(dmsp), fitted on the 2012-2013 overlap.
+# Every fit only needs the sums n, Σx, Σy, Σxx, Σxy: per-group fits are one bincount pass
+# over all rows and bootstrap replicates are one matrix product with resampling counts.
+
+def _solve(n, sx, sy, sxx, sxy):
+    # Arrays of sums in, arrays of (alpha, beta) out; NaN where x has no variance
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        alpha = (sy - beta * sx) / n
+    return alpha, beta
+
+
+def _centered(x, y):
+    # Shifting both variables by their means keeps the sums small; the intercept is shifted back
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x_mean, y_mean = x.mean(), y.mean()
+    return x - x_mean, y - y_mean, x_mean, y_mean
+
+
+def _terms(x, y):
+    return np.column_stack([np.ones_like(x), x, y, x * x, x * y])  # Per-row addends of the sums
+
+
+def _known(groups):
+    # Group labels as objects plus a mask of rows that have one (None/NaN: district without a state)
+    groups = np.asarray(groups, dtype=object)
+    return groups, np.array([g is not None and g == g for g in groups.tolist()], dtype=bool)
+
+
+def fit(x, y):
+    xc, yc, x_mean, y_mean = _centered(x, y)
+    alpha, beta = _solve(*_terms(xc, yc).sum(axis=0))
+    return float(alpha + y_mean - beta * x_mean), float(beta)
+
+
+def fit_groups(x, y, groups):
+    # One fit per distinct group value -> {group: (alpha, beta, n)}; rows without a group are left out
+    xc, yc, x_mean, y_mean = _centered(x, y)
+    groups, known = _known(groups)
+    keys, codes = np.unique(groups[known], return_inverse=True)
+    sums = [np.bincount(codes, weights=column[known], minlength=len(keys)) for column in _terms(xc, yc).T]
+    alpha, beta = _solve(*sums)
+    alpha = alpha + y_mean - beta * x_mean
+    return {key: (float(a), float(b), int(n)) for key, a, b, n in zip(keys.tolist(), alpha, beta, sums[0])}
+
+
+def bootstrap_fit(x, y, replicates=1000, level=0.95, seed=0):
+    # Percentile intervals from `replicates` resamples; each batch draws a (batch, n) matrix of
+    # resampling counts, so a replicate's sums are one row of counts @ terms
+    xc, yc, x_mean, y_mean = _centered(x, y)
+    terms = _terms(xc, yc)
+    n = len(terms)
+    rng = np.random.default_rng(seed)
+    batch = max(1, min(replicates, 10_000_000 // max(n, 1)))  # Bounds the count matrix to ~80 MB
+    alphas, betas = [], []
+    for start in range(0, replicates, batch):
+        counts = rng.multinomial(n, np.full(n, 1.0 / n), size=min(batch, replicates - start))
+        alpha, beta = _solve(*(counts @ terms).T)
+        alphas.append(alpha + y_mean - beta * x_mean)
+        betas.append(beta)
+    quantiles = [(1 - level) / 2, (1 + level) / 2]
+    return {
+        "alpha": np.nanquantile(np.concatenate(alphas), quantiles).tolist(),
+        "beta": np.nanquantile(np.concatenate(betas), quantiles).tolist(),
+        "level": level,
+        "replicates": replicates,
+        "seed": seed,
+    }
+
+
+def intercalibrate(x, y, groups=None, mode="pooled", min_group_size=10, replicates=1000, seed=0):
+    # Fits and their summary, stored with the data (the "chosen" block is what gets applied)
+    alpha, beta = fit(x, y)
+    calibration = {
+        "model": "log(viirs + 1e-6) = alpha + beta * log(dmsp + 1e-6)",
+        "mode": mode,
+        "n": int(len(x)),
+        "pooled": {"alpha": alpha, "beta": beta},
+    }
+    if replicates:
+        calibration["bootstrap"] = bootstrap_fit(x, y, replicates=replicates, seed=seed)
+    if mode == "state":
+        # Groups with too few overlap rows (or no spread in x), and rows without a group, keep the pooled fit
+        calibration["min_group_size"] = min_group_size
+        calibration["groups"] = {
+            str(key): {"alpha": a, "beta": b, "n": count}
+            for key, (a, b, count) in fit_groups(x, y, groups).items()
+            if count >= min_group_size and np.isfinite(b)
+        }
+    return calibration
+
+
+def calibrated_log(calibration, log_x, groups=None):
+    # Applies the chosen fit: the group's own coefficients where it has them, pooled otherwise
+    log_x = np.asarray(log_x, dtype=np.float64)
+    alpha = np.full(len(log_x), calibration["pooled"]["alpha"])
+    beta = np.full(len(log_x), calibration["pooled"]["beta"])
+    if calibration["mode"] == "state" and groups is not None:
+        groups, known = _known(groups)
+        groups = groups.astype(str)
+        for key, coefficients in calibration["groups"].items():
+            rows = known & (groups == key)
+            alpha[rows] = coefficients["alpha"]
+            beta[rows] = coefficients["beta"]
+    return alpha + beta * log_x
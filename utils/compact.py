@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+
+# ✅ Compact in-memory representation for the low-RAM deployment tier.
+# Repeated strings become dictionary-encoded categoricals, the pc11 ids become
+# small integer codes and measures are downcast to float32 where that changes nothing users see.
+
+CATEGORY_COLUMNS = ["state", "district", "area_cat", "pop_cat"]
+ID_COLUMNS = ["pc11_state_id", "pc11_district_id"]
+DISPLAY_DECIMALS = (2, 3)  # Table, hover text and exports round to 2 decimals, the map to 3
+
+
+def float32_exact(values, decimals=DISPLAY_DECIMALS):
+    # True when the float32 copy rounds to the same numbers as the original at every displayed precision
+    values = np.asarray(values, dtype=np.float64)
+    narrowed = values.astype(np.float32).astype(np.float64)
+    return all(np.array_equal(np.round(values, d), np.round(narrowed, d), equal_nan=True) for d in decimals)
+
+
+def compact_frame(df):
+    df = df.copy(deep=False)  # New column containers, shared buffers until converted
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    # "024" -> 24; zero padding can be restored with str.zfill(3)
+    for col in ID_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    for col in df.select_dtypes(include=["integer"]).columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    # Columns like area (values up to ~10^5 with cents) lose a displayed digit in float32 and stay float64
+    for col in df.select_dtypes(include=["float"]).columns:
+        if df[col].dtype != np.float32 and float32_exact(df[col].to_numpy()):
+            df[col] = df[col].astype(np.float32)
+
+    return df
+
+
+def memory_report(df, label="dataset"):
+    usage = df.memory_usage(deep=True, index=True)
+    print(f"🧮 Memory used by {label}: {usage.sum() / 1e6:.2f} MB ({len(df):,} rows)")
+    for col, nbytes in usage.items():
+        dtype = df.index.dtype if col == "Index" else df[col].dtype
+        print(f"    {col:<20} {str(dtype):<10} {nbytes / 1e3:>10.1f} KB")
+    return usage
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+# ✅ Pre-aggregated cubes written by prep_data.py to clean/cubes/<level>.parquet.
+# One row per (level, year) with the district count, summed area/pop11 and, for every yearly
+# measure, the pop11- and area-weighted means. The weighted sums and weights behind each mean
+# are kept too, so any set of states can be rolled up again exactly (e.g. only the selected ones).
+
+CUBE_LEVELS = {
+    "state": ["state", "area_cat", "pop_cat"],  # Categories are per state, so they ride along
+    "area_cat": ["area_cat"],
+    "pop_cat": ["pop_cat"],
+}
+CUBE_MEASURES = ["nightlights", "forest_cover", "pm25"]
+CUBE_WEIGHTS = ["pop11", "area"]
+
+# Weighting behind the plain measure columns: exposure-style measures follow people,
+# tree cover follows land
+DEFAULT_WEIGHTS = {"nightlights": "pop11", "pm25": "pop11", "forest_cover": "area"}
+
+
+def _additive_columns():
+    return ["districts", "area", "pop11"] + [
+        f"{kind}_{m}_{w}" for m in CUBE_MEASURES for w in CUBE_WEIGHTS for kind in ("wsum", "weight")
+    ]
+
+
+def _aggregate_year(table, keys):
+    # Weighted sums skip rows where the measure is missing, in both numerator and weight
+    columns = {k: table[k].cast(pa.string()) for k in keys}
+    columns["year"] = table["year"]
+    columns["districts"] = pc.if_else(pc.is_valid(table["pc11_district_id"]), 1, 0)
+    for w in CUBE_WEIGHTS:
+        columns[w] = table[w].cast(pa.float64())
+    for m in CUBE_MEASURES:
+        values = table[m].cast(pa.float64())
+        for w in CUBE_WEIGHTS:
+            columns[f"wsum_{m}_{w}"] = pc.multiply(values, columns[w])
+            columns[f"weight_{m}_{w}"] = pc.if_else(pc.is_valid(values), columns[w], None)
+    grouped = pa.table(columns).group_by(keys + ["year"]).aggregate([(c, "sum") for c in _additive_columns()])
+    return grouped.rename_columns([c.removesuffix("_sum") for c in grouped.column_names])
+
+
+def build_cube(table, level):
+    # Aggregated one year at a time, so the float64 temporaries stay small at any scale
+    if isinstance(table, pd.DataFrame):
+        table = pa.Table.from_pandas(table, preserve_index=False)
+    keys = CUBE_LEVELS[level]
+    years = pc.unique(table["year"]).to_pylist()
+    parts = [_aggregate_year(table.filter(pc.equal(table["year"], year)), keys) for year in years]
+    cube = pa.concat_tables(parts).to_pandas()
+    return finish_cube(cube, keys)
+
+
+def finish_cube(cube, keys):
+    # Weighted means and log columns (same definitions as prep_data.py) from the additive columns
+    for m in CUBE_MEASURES:
+        for w in CUBE_WEIGHTS:
+            weight = cube[f"weight_{m}_{w}"].where(cube[f"weight_{m}_{w}"] > 0)
+            cube[f"{m}_{w}_weighted"] = cube[f"wsum_{m}_{w}"] / weight
+        cube[m] = cube[f"{m}_{DEFAULT_WEIGHTS[m]}_weighted"]
+        cube[f"log_{m}"] = np.log1p(cube[m])
+    cube["log_area"] = np.log(cube["area"])
+    cube["log_pop11"] = np.log(cube["pop11"])
+    return cube.sort_values(keys + ["year"], kind="stable").reset_index(drop=True)
+
+
+def roll_up(cube, level):
+    # Coarser cube from a finer one (state rows -> area_cat/pop_cat), exact thanks to the sums
+    keys = CUBE_LEVELS[level]
+    rolled = cube.groupby(keys + ["year"], as_index=False, observed=True, dropna=False)[_additive_columns()].sum(min_count=1)
+    return finish_cube(rolled, keys)
+
+
+def cube_path(folder, level):
+    return folder / f"{level}.parquet"
+
+
+def write_cubes(table, folder, data_version):
+    folder.mkdir(parents=True, exist_ok=True)
+    for level in CUBE_LEVELS:
+        cube = pa.Table.from_pandas(build_cube(table, level), preserve_index=False)
+        cube = cube.replace_schema_metadata({**cube.schema.metadata, b"data_version": data_version.encode()})
+        pq.write_table(cube, cube_path(folder, level))
+
+
+def read_cube(folder, level, data_version):
+    # None when the file is missing or was built from another version of the data
+    path = cube_path(folder, level)
+    if not path.exists():
+        return None
+    version = (pq.read_schema(path).metadata or {}).get(b"data_version", b"").decode()
+    if version != data_version:
+        return None
+    return pd.read_parquet(path)
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import shutil
+from functools import reduce
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+
+
+# ✅ Data-access layer over the partitioned parquet dataset written by prep_data.py.
+# Column projection and state/district/year predicates are pushed down to pyarrow, so
+# partitions and row groups whose min/max statistics cannot match are never read.
+
+DIMENSION_COLUMNS = ["state", "district", "area_cat", "pop_cat", "pc11_state_id", "pc11_district_id"]
+
+
+class DataStore:
+    def __init__(self, path):
+        self.path = path
+        self.dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        self.columns = self._column_order(self.dataset.schema)
+        self._year_counts = None
+
+    @staticmethod
+    def _column_order(schema):
+        # The partition key is appended last by pyarrow; restore the original order from
+        # the pandas metadata stored in the files
+        names = schema.names
+        metadata = json.loads((schema.metadata or {}).get(b"pandas", b"{}"))
+        original = [c["name"] for c in metadata.get("columns", []) if c.get("name") in names]
+        return original + [c for c in names if c not in original]
+
+    @property
+    def numeric_columns(self):
+        schema = self.dataset.schema
+        return {c for c in self.columns if pa.types.is_integer(schema.field(c).type) or pa.types.is_floating(schema.field(c).type)}
+
+    @property
+    def version(self):
+        # Changes whenever a data file is rewritten
+        digest = hashlib.sha256()
+        for fragment in sorted(self.dataset.files):
+            stat = self.dataset.filesystem.get_file_info(fragment)
+            digest.update(f"{fragment}:{stat.size}:{stat.mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def year_counts(self):
+        # Rows per year partition, from the parquet footers only
+        if self._year_counts is None:
+            counts = {}
+            for fragment in self.dataset.get_fragments():
+                year = int(ds.get_partition_keys(fragment.partition_expression)["year"])
+                counts[year] = counts.get(year, 0) + fragment.count_rows()
+            self._year_counts = dict(sorted(counts.items()))
+        return self._year_counts
+
+    @property
+    def years(self):
+        return list(self.year_counts())
+
+    def expression(self, states=None, districts=None, years=None):
+        conditions = []
+        if states is not None:
+            conditions.append(ds.field("state").isin(list(states)))
+        if districts is not None:
+            conditions.append(ds.field("district").isin(list(districts)))
+        if years is not None:
+            conditions.append(ds.field("year").isin([int(y) for y in years]))
+        return reduce(lambda a, b: a & b, conditions) if conditions else None
+
+    def read_table(self, columns=None, states=None, districts=None, years=None):
+        columns = [c for c in (columns or self.columns) if c in self.columns]
+        return self.dataset.to_table(columns=columns, filter=self.expression(states, districts, years))
+
+    def read(self, columns=None, states=None, districts=None, years=None):
+        return self.read_table(columns, states, districts, years).to_pandas()
+
+    def page(self, columns, start, stop, sort_keys=(("year", "descending"), ("state", "ascending"), ("district", "ascending"))):
+        # One block of the default table order (newest year first) reading only the
+        # year partitions that overlap [start, stop)
+        descending = dict(sort_keys).get("year") == "descending"
+        years = sorted(self.year_counts(), reverse=descending)
+        wanted, offset = [], 0
+        for year in years:
+            count = self._year_counts[year]
+            if offset + count > start and offset < stop:
+                wanted.append(year)
+            offset += count
+        if not wanted:
+            return self.read(columns, years=[])
+
+        skipped = 0
+        for year in years:
+            if year == wanted[0]:
+                break
+            skipped += self._year_counts[year]
+
+        keys = [k for k, _ in sort_keys]
+        table = self.read_table(list(dict.fromkeys(list(columns) + keys)), years=wanted).sort_by(list(sort_keys))
+        return table.slice(start - skipped, stop - start).select([c for c in columns if c in self.columns]).to_pandas()
+
+    def schema(self, columns):
+        return pa.schema([self.dataset.schema.field(c) for c in columns if c in self.columns])
+
+    def batches(self, columns, states=None, districts=None, batch_rows=64 * 1024):
+        # Record batches of a selection in the default table order, one year partition in memory at a time
+        if states is not None and not states:
+            return
+        for year in sorted(self.year_counts(), reverse=True):
+            table = self.read_table(list(dict.fromkeys(list(columns) + ["state", "district"])), states, districts, [year])
+            table = table.sort_by([("state", "ascending"), ("district", "ascending")])
+            yield from table.select([c for c in columns if c in self.columns]).to_batches(max_chunksize=batch_rows)
+
+    def __len__(self):
+        return sum(self.year_counts().values())
+
+
+# ✅ Uncompressed Arrow IPC file, memory-mapped read-only by every worker. Fixed-width
+# columns become numpy views on the mapped pages, so N workers share one physical copy.
+def read_arrow(path):
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    return table.to_pandas(split_blocks=True)  # One block per column keeps them zero-copy
+
+
+def write_arrow(df, path):
+    # Written next to the target and renamed over it: running workers keep their mapping of
+    # the old inode instead of faulting on a file truncated underneath them
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def write_partitioned(df, path, row_group_size=64 * 1024, presorted=False):
+    # Hive-partitioned by year, rows sorted by (state, district) inside each partition so
+    # every row group carries tight min/max statistics on state and district. A frame already
+    # in (state, district, year) order keeps that order within each year, so it is not re-sorted.
+    if not presorted:
+        df = df.sort_values(["year", "state", "district"])
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    shutil.rmtree(path, ignore_errors=True)  # Drop partitions of years that no longer exist
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("year", table.schema.field("year").type)]), flavor="hive"),
+        max_rows_per_group=row_group_size,
+        min_rows_per_group=min(row_group_size, 1024),
+    )
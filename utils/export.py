@@ -0,0 +1,113 @@
+import io
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+# ✅ Streaming exports: record batches in, CSV or Parquet bytes out, one chunk per batch.
+# Nothing holds more than a batch of rows, so a Flask Response over these generators is sent
+# with chunked transfer encoding whatever the size of the selection.
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+BATCH_ROWS = 64 * 1024
+
+
+def plain_schema(schema):
+    # Categorical (dictionary) columns are written as their values
+    return pa.schema([pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type) for f in schema])
+
+
+def frame_schema(frame, columns):
+    return plain_schema(pa.Schema.from_pandas(frame.iloc[:0][columns], preserve_index=False))
+
+
+def widened(schema):
+    # Float columns as float64, the type rounded() produces
+    return pa.schema([pa.field(f.name, pa.float64()) if pa.types.is_floating(f.type) else f for f in schema])
+
+
+def frame_batches(frame, columns, positions=None, batch_rows=BATCH_ROWS):
+    # Batches of `frame` rows, all of them or `positions` in that order; only one batch is copied at a time
+    count = len(frame) if positions is None else len(positions)
+    for start in range(0, count, batch_rows):
+        rows = slice(start, start + batch_rows) if positions is None else positions[start:start + batch_rows]
+        yield pa.RecordBatch.from_pandas(frame.iloc[rows][columns], preserve_index=False)
+
+
+def rounded(batches, decimals):
+    # Same rule as grid.rows_response: floats widened to float64, then rounded
+    for batch in batches:
+        arrays = [
+            pc.round(array.cast(pa.float64()), decimals) if pa.types.is_floating(array.type) else array
+            for array in batch.columns
+        ]
+        yield pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+
+def _conform(batch, schema):
+    # Batches from different sources (pandas slices, dataset fragments) share one output schema
+    return pa.RecordBatch.from_arrays(
+        [batch.column(f.name).cast(f.type) for f in schema], schema=schema
+    )
+
+
+class _ChunkSink:
+    # File-like target for ParquetWriter that hands back whatever was written since the last drain
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def csv_chunks(batches, schema):
+    sink = io.BytesIO()
+    pa_csv.write_csv(schema.empty_table(), sink)  # Header, even for an empty selection
+    yield sink.getvalue()
+    for batch in batches:
+        sink = io.BytesIO()
+        pa_csv.write_csv(_conform(batch, schema), sink, pa_csv.WriteOptions(include_header=False))
+        yield sink.getvalue()
+
+
+def parquet_chunks(batches, schema, batch_rows=BATCH_ROWS):
+    # Small batches (one per year of a narrow selection) are merged into row groups of up to
+    # batch_rows rows; each row group is sent as soon as it is written, the footer comes last
+    sink = _ChunkSink()
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            pending.append(_conform(batch, schema))
+            pending_rows += batch.num_rows
+            if pending_rows >= batch_rows:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=batch_rows)
+                pending, pending_rows = [], 0
+                yield sink.drain()
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=batch_rows)
+    yield sink.drain()
+
+
+def export_chunks(fmt, batches, schema):
+    schema = plain_schema(schema)
+    return csv_chunks(batches, schema) if fmt == "csv" else parquet_chunks(batches, schema)
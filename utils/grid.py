@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import record_cache
+
+
+# ✅ Backend for AgGrid's infinite row model.
+# The grid sends a getRowsRequest (startRow, endRow, sortModel, filterModel);
+# we filter and sort the prepared table frame here and return only that block.
+
+_ORDER_CACHE_SIZE = 32
+_order_cache = OrderedDict()  # (frame key, sort, filter) -> row positions
+_order_lock = threading.Lock()  # gthread workers page through the grid from several threads
+
+
+def _reset_order_lock():
+    global _order_lock
+    _order_lock = threading.Lock()  # A lock held at fork time stays held in the child
+
+os.register_at_fork(after_in_child=_reset_order_lock)
+
+
+def _text_mask(series, spec):
+    kind = spec.get("type", "contains")
+    values = series.astype("string").str.lower()
+    if kind == "blank":
+        return series.isna()
+    if kind == "notBlank":
+        return series.notna()
+
+    needle = str(spec.get("filter", "")).lower()
+    if kind == "contains":
+        mask = values.str.contains(needle, regex=False)
+    elif kind == "notContains":
+        mask = ~values.str.contains(needle, regex=False)
+    elif kind == "equals":
+        mask = values == needle
+    elif kind == "notEqual":
+        mask = values != needle
+    elif kind == "startsWith":
+        mask = values.str.startswith(needle)
+    elif kind == "endsWith":
+        mask = values.str.endswith(needle)
+    else:
+        return pd.Series(True, index=series.index)
+    return mask.fillna(False).astype(bool)
+
+
+def _number_mask(series, spec):
+    kind = spec.get("type", "equals")
+    if kind == "blank":
+        return series.isna()
+    if kind == "notBlank":
+        return series.notna()
+
+    value = spec.get("filter")
+    if value is None:
+        return pd.Series(True, index=series.index)
+    if kind == "equals":
+        return series == value
+    if kind == "notEqual":
+        return series != value
+    if kind == "lessThan":
+        return series < value
+    if kind == "lessThanOrEqual":
+        return series <= value
+    if kind == "greaterThan":
+        return series > value
+    if kind == "greaterThanOrEqual":
+        return series >= value
+    if kind == "inRange":
+        return (series >= value) & (series <= spec.get("filterTo", value))
+    return pd.Series(True, index=series.index)
+
+
+def _column_mask(series, spec):
+    # Combined filters: newer AG Grid sends "conditions", older sends condition1/condition2
+    if "operator" in spec:
+        conditions = spec.get("conditions") or [spec.get("condition1"), spec.get("condition2")]
+        masks = [_column_mask(series, c) for c in conditions if c]
+        if not masks:
+            return pd.Series(True, index=series.index)
+        combined = masks[0]
+        for mask in masks[1:]:
+            combined = (combined | mask) if spec["operator"] == "OR" else (combined & mask)
+        return combined
+
+    if spec.get("filterType") == "number":
+        return _number_mask(series, spec)
+    return _text_mask(series, spec)
+
+
+def filter_frame(df, filter_model):
+    mask = np.ones(len(df), dtype=bool)
+    for col, spec in (filter_model or {}).items():
+        if col in df.columns and spec:
+            mask &= _column_mask(df[col], spec).to_numpy(dtype=bool)
+    return df[mask]
+
+
+def sort_frame(df, sort_model):
+    sort_model = [s for s in (sort_model or []) if s.get("colId") in df.columns]
+    if not sort_model:
+        return df  # Frame is already in the default display order
+    return df.sort_values(
+        [s["colId"] for s in sort_model],
+        ascending=[s.get("sort", "asc") == "asc" for s in sort_model],
+        kind="stable",
+    )
+
+
+def row_order(df, frame_key, sort_model, filter_model):
+    # Positions of the filtered + sorted rows; cached so paging through one view
+    # only slices instead of re-filtering the whole frame on every block request.
+    key = (frame_key, json.dumps(sort_model or [], sort_keys=True), json.dumps(filter_model or {}, sort_keys=True))
+    with _order_lock:
+        positions = _order_cache.get(key)
+        if positions is not None:
+            _order_cache.move_to_end(key)
+    record_cache("grid_order", positions is not None)
+    if positions is not None:
+        return positions
+
+    view = df.reset_index(drop=True)
+    view = sort_frame(filter_frame(view, filter_model), sort_model)
+    positions = view.index.to_numpy()
+
+    with _order_lock:
+        _order_cache[key] = positions
+        if len(_order_cache) > _ORDER_CACHE_SIZE:
+            _order_cache.popitem(last=False)
+    return positions
+
+
+def get_rows(df, request, frame_key=None, decimals=None):
+    request = request or {}
+    start = int(request.get("startRow") or 0)
+    end = int(request.get("endRow") or start)
+
+    positions = row_order(df, frame_key, request.get("sortModel"), request.get("filterModel"))
+    return rows_response(df.iloc[positions[start:end]], len(positions), decimals)
+
+
+def rows_response(block, row_count, decimals=None):
+    # Widen compact float32 columns so 0.03 is sent as 0.03, not 0.0299999993
+    float_cols = block.select_dtypes(include=["float"]).columns
+    if len(float_cols):
+        block = block.astype({col: "float64" for col in float_cols})
+        if decimals is not None:
+            block = block.round({col: decimals for col in float_cols})
+    return {"rowData": block.to_dict("records"), "rowCount": int(row_count)}
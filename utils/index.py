@@ -0,0 +1,123 @@
+import numpy as np
+
+
+# ✅ Positional state/district index.
+# The frame is sorted once by (state, district, year) so every state and every
+# district occupies a contiguous block of rows. Filtering a selection then means
+# slicing or concatenating those blocks instead of scanning the frame with isin.
+
+# Group values offered in the state dropdown -> (category column, category value)
+STATE_GROUPS = {
+    "All-states": None,
+    "Large-states": ("area_cat", "Large"),
+    "Medium-states": ("area_cat", "Medium"),
+    "Small-states": ("area_cat", "Small"),
+    "High-pop": ("pop_cat", "High"),
+    "Medium-pop": ("pop_cat", "Medium"),
+    "Low-pop": ("pop_cat", "Low"),
+}
+
+
+def _keys(series):
+    # Compare integer codes for dictionary-encoded columns, raw values otherwise
+    if hasattr(series, "cat"):
+        return series.cat.codes.to_numpy()
+    return series.to_numpy()
+
+
+def _block_bounds(*columns):
+    # Start/stop positions of runs of equal keys in already-sorted columns
+    n = len(columns[0])
+    if n == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    change = np.zeros(n - 1, dtype=bool)
+    for values in columns:
+        change |= values[1:] != values[:-1]
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    stops = np.concatenate((starts[1:], [n]))
+    return starts, stops
+
+
+SORT_COLUMNS = ["state", "district", "year"]
+
+
+# ✅ State/group/district lookups without the rows (also built from the metadata sidecar)
+class DistrictCatalog:
+    def __init__(self, state_districts, groups):
+        self.state_districts = state_districts
+        self.groups = groups
+        self.states = sorted(state_districts)
+
+    def expand(self, selected_states):
+        # Replace group values with their member states
+        expanded = set()
+        for state in selected_states or []:
+            expanded.update(self.groups.get(state, [state]))
+        return sorted(s for s in expanded if s in self.state_districts)
+
+    def districts(self, states):
+        # District names of the given states in (state, district) order, without duplicates
+        names = {}
+        for state in sorted(states):
+            names.update(dict.fromkeys(self.state_districts.get(state, [])))
+        return list(names)
+
+
+class DistrictIndex(DistrictCatalog):
+    def __init__(self, df, presorted=False):
+        # presorted skips the copy for frames already written in SORT_COLUMNS order
+        self.frame = df if presorted else df.sort_values(SORT_COLUMNS, kind="stable").reset_index(drop=True)
+        states = self.frame["state"]
+        districts = self.frame["district"]
+
+        # Contiguous row ranges per state and per (state, district)
+        starts, stops = _block_bounds(_keys(states))
+        names = states.iloc[starts].tolist()
+        self.state_ranges = {s: (int(a), int(b)) for s, a, b in zip(names, starts, stops)}
+
+        starts, stops = _block_bounds(_keys(states), _keys(districts))
+        self.district_ranges = {}
+        state_districts = {state: [] for state in self.state_ranges}
+        for state, district, a, b in zip(states.iloc[starts].tolist(), districts.iloc[starts].tolist(), starts, stops):
+            self.district_ranges[(state, district)] = (int(a), int(b))
+            state_districts[state].append(district)
+
+        # Precomputed expansion of the dropdown group values
+        groups = {}
+        for group, category in STATE_GROUPS.items():
+            if category is None:
+                groups[group] = sorted(self.state_ranges)
+            else:
+                column, value = category
+                members = self.frame.loc[self.frame[column] == value, "state"].unique()
+                groups[group] = sorted(members)
+        super().__init__(state_districts, groups)
+
+    def ranges(self, states, districts=None):
+        states = sorted(states)
+        if not districts:
+            return [self.state_ranges[s] for s in states if s in self.state_ranges]
+        wanted = set(districts)
+        return [
+            self.district_ranges[(s, d)]
+            for s in states
+            for d in self.state_districts.get(s, [])
+            if d in wanted
+        ]
+
+    def take(self, states, districts=None):
+        # Merge adjacent blocks (neighbouring states/districts) before slicing
+        ranges = []
+        for start, stop in sorted(self.ranges(states, districts)):
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+
+        if not ranges:
+            return self.frame.iloc[0:0]
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return self.frame.iloc[start:stop]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        return self.frame.iloc[positions]
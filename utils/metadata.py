@@ -0,0 +1,49 @@
+import json
+import os
+
+from utils.snapshots import file_digest
+
+
+# ✅ Metadata sidecar written by prep_data.py next to final_data.parquet.
+# It holds everything the layout needs (states, districts per state, group membership,
+# columns, years, data version), so app.py can start without loading the rows.
+
+def build_metadata(index, columns, numeric_columns, years, data_version, nightlights_calibration=None):
+    metadata = {
+        "data_version": data_version,
+        "columns": list(columns),
+        "numeric_columns": sorted(numeric_columns),
+        "years": [int(y) for y in years],
+        "states": index.states,
+        "districts": index.state_districts,
+        "groups": {group: list(states) for group, states in index.groups.items()},
+    }
+    if nightlights_calibration:
+        metadata["nightlights_calibration"] = nightlights_calibration  # Coefficients applied by prep_data.py
+    return metadata
+
+
+def write_metadata(metadata, path, source_path):
+    # The source file's size and mtime are recorded so a parquet replaced without re-running prep is noticed
+    stat = source_path.stat()
+    metadata = dict(metadata, source={"name": source_path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(metadata, indent=1, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def read_metadata(path, source_path):
+    # None when the sidecar is missing or was written for a different source file
+    try:
+        metadata = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if not source_path.exists():
+        return None
+    stat, source = source_path.stat(), metadata.get("source", {})
+    if source.get("size") == stat.st_size and source.get("mtime_ns") == stat.st_mtime_ns:
+        return metadata
+    # Touched or rewritten (possibly at the same size): still valid only if the content is the same
+    if file_digest(source_path) != metadata.get("data_version"):
+        return None
+    return metadata
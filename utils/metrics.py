@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+
+
+# ✅ Per-callback instrumentation for the Dash server.
+# Every request to /_dash-update-component is attributed to the Python callback that serves
+# it (other routes to their Flask endpoint) and records latency, response bytes, rows
+# processed and cache hits/misses. /metrics renders everything in the Prometheus text
+# format; each gunicorn worker keeps and serves its own numbers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 1e8)
+
+_enabled = False  # Flipped by init_app; record_* calls return immediately while it is False
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, not current, outside Linux
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.response_bytes = {}
+        self.requests = {}  # (callback, status) -> count
+        self.rows = {}
+        self.cache = {}  # (callback, cache, result) -> count
+        self.gauges = {}  # name -> (help, func returning a number)
+
+    def gauge(self, name, help_text, func):
+        self.gauges[name] = (help_text, func)
+
+    def observe(self, callback, status, seconds, nbytes, rows, cache_events):
+        with self._lock:
+            self.latency.setdefault(callback, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.response_bytes.setdefault(callback, Histogram(BYTES_BUCKETS)).observe(nbytes)
+            self.requests[(callback, status)] = self.requests.get((callback, status), 0) + 1
+            self.rows[callback] = self.rows.get(callback, 0) + rows
+            for cache, result in cache_events:
+                key = (callback, cache, result)
+                self.cache[key] = self.cache.get(key, 0) + 1
+
+    def _histogram_lines(self, name, help_text, histograms):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for callback, hist in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(callback=callback, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(callback=callback)} {hist.total:.6f}")
+            lines.append(f"{name}_count{_labels(callback=callback)} {hist.count}")
+        return lines
+
+    def render(self):
+        with self._lock:
+            lines = self._histogram_lines("dash_callback_latency_seconds", "Server time per callback request.", self.latency)
+            lines += self._histogram_lines("dash_callback_response_bytes", "Response payload size per callback request.", self.response_bytes)
+
+            lines += ["# HELP dash_callback_requests_total Callback requests by HTTP status.", "# TYPE dash_callback_requests_total counter"]
+            lines += [f"dash_callback_requests_total{_labels(callback=c, status=s)} {n}" for (c, s), n in sorted(self.requests.items())]
+
+            lines += ["# HELP dash_callback_rows_total Data rows processed by callbacks.", "# TYPE dash_callback_rows_total counter"]
+            lines += [f"dash_callback_rows_total{_labels(callback=c)} {n}" for c, n in sorted(self.rows.items())]
+
+            lines += ["# HELP dash_cache_requests_total Cache lookups made by callbacks.", "# TYPE dash_cache_requests_total counter"]
+            lines += [f"dash_cache_requests_total{_labels(callback=c, cache=k, result=r)} {n}" for (c, k, r), n in sorted(self.cache.items())]
+
+        lines += ["# HELP process_resident_memory_bytes Resident memory of this worker.", "# TYPE process_resident_memory_bytes gauge",
+                  f"process_resident_memory_bytes {rss_bytes()}"]
+        for name, (help_text, func) in sorted(self.gauges.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {func()}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# ✅ Called from inside callbacks; no-ops outside an instrumented request
+def record_rows(count):
+    if _enabled and has_request_context():
+        g.metrics_rows = g.get("metrics_rows", 0) + int(count)
+
+
+def record_cache(cache, hit):
+    if _enabled and has_request_context():
+        g.setdefault("metrics_cache", []).append((cache, "hit" if hit else "miss"))
+
+
+def _callback_names(app):
+    # "output id.prop" key of the callback map -> Python function name (clientside ones have none)
+    return {key: entry["callback"].__name__ for key, entry in app.callback_map.items() if entry.get("callback")}
+
+
+def init_app(app, log_file=None):
+    global _enabled
+    _enabled = True
+    server = app.server
+    names = {}
+    log = None
+    if log_file:
+        log = logging.getLogger("dash.metrics")
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        handler = logging.FileHandler(log_file)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+
+    @server.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record_request(response):
+        if request.endpoint in ("metrics_endpoint", "static") or "metrics_start" not in g:
+            return response
+        seconds = time.perf_counter() - g.metrics_start
+
+        if request.path.endswith("/_dash-update-component"):
+            if not names:
+                names.update(_callback_names(app))
+            output = (request.get_json(silent=True) or {}).get("output", "")
+            callback = names.get(output, output)
+        else:
+            callback = f"route:{request.endpoint}"
+
+        nbytes = 0 if response.is_streamed else response.calculate_content_length() or 0
+        rows = g.get("metrics_rows", 0)
+        cache_events = g.get("metrics_cache", [])
+        metrics.observe(callback, response.status_code, seconds, nbytes, rows, cache_events)
+
+        if log is not None:
+            log.info(json.dumps({
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "pid": os.getpid(),
+                "callback": callback,
+                "status": response.status_code,
+                "seconds": round(seconds, 4),
+                "bytes": nbytes,
+                "rows": rows,
+                "cache": [f"{cache}:{result}" for cache, result in cache_events],
+                "rss_mb": round(rss_bytes() / 1e6, 1),
+            }))
+        return response
+
+    @server.route("/metrics", endpoint="metrics_endpoint")
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return metrics
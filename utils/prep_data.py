@@ -2,9 +2,17 @@ import pandas as pd
 import geopandas as gpd
 import pyreadstat
 import sys
+import argparse
+import hashlib
+import inspect
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
 from pyarrow import parquet as pq
-from sklearn.linear_model import LinearRegression
 import numpy as np
 
 # Ensure required dependencies are installed
@@ -17,11 +25,17 @@ except ImportError:
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 # Import config
-from config import data_folder  
+from config import data_folder, clean_data_folder, cache_folder
+from utils.snapshots import file_digest
+from utils.datastore import DIMENSION_COLUMNS, write_arrow, write_partitioned
+from utils.index import SORT_COLUMNS, DistrictIndex
+from utils.metadata import build_metadata, write_metadata
+from utils.cubes import write_cubes
+from utils.calibration import fit, fit_groups, bootstrap_fit, intercalibrate, calibrated_log
+from utils.topology import GEOMETRY_LEVELS, read_geometry_index, write_topologies
 
 # Define directories
 raw_data_folder = data_folder / "raw"
-clean_data_folder = data_folder / "clean"
 clean_data_folder.mkdir(parents=True, exist_ok=True)  # Ensure clean directory exists
 
 # Define file paths
@@ -34,21 +48,64 @@ pm25_path = raw_data_folder / "pm25_pc11dist_1998_2020.dta"
 vcf_path = raw_data_folder / "vcf_pc11dist_2001_2020.dta"
 
 data_parquet_path = clean_data_folder / "final_data.parquet"
+dataset_path = clean_data_folder / "final_data"  # Year-partitioned copy read by DATA_BACKEND=dataset
+arrow_path = clean_data_folder / "final_data.arrow"  # Pre-sorted Arrow IPC file mapped by DATA_BACKEND=mmap
+metadata_path = clean_data_folder / "final_data.meta.json"  # Layout metadata read by app.py at startup
+cubes_path = clean_data_folder / "cubes"  # State / area_cat / pop_cat aggregates per year for the drill-down view
+geometry_path = clean_data_folder / "geometry"  # Simplified district TopoJSON per resolution for the map tab
+dataset_row_group_size = 64 * 1024
+
+# Intermediate per-stage outputs and the manifest describing them
+stage_cache_folder = cache_folder / "stages"
+manifest_path = stage_cache_folder / "manifest.json"
+
+# ✅ DMSP -> VIIRS intercalibration: "pooled" fits one log-linear model on the 2012-2013 overlap,
+# "state" fits one per state in the same pass (states with fewer than calibration_min_rows
+# overlap rows keep the pooled fit). Bootstrap intervals are stored with the coefficients.
+nightlights_calibration = "pooled"
+calibration_min_rows = 10
+calibration_replicates = 1000
+
+# ✅ Streaming Stata reader: only the needed columns are decoded and each row chunk is
+# filtered/reduced as it arrives, so peak memory follows the chunk size, not the file size
+stata_chunksize = 100_000
+
+def read_stata_chunks(path, usecols, reduce_chunk=None, chunksize=None):
+    parts = []
+    reader = pyreadstat.read_file_in_chunks(pyreadstat.read_dta, path, chunksize=chunksize or stata_chunksize, usecols=usecols)
+    for chunk, _ in reader:
+        parts.append(reduce_chunk(chunk) if reduce_chunk else chunk)
+    if not parts:
+        return pd.DataFrame(columns=usecols)
+    return pd.concat(parts, ignore_index=True)
+
+def in_years(df, first=2001, last=2020):
+    return df[(df["year"] >= first) & (df["year"] <= last)]
+
+def latest_dmsp_version(df):
+    # Sort and keep the latest DMSP version per (year, district); applied per chunk and
+    # again after concatenation, since a district-year can straddle two chunks
+    df = df.sort_values(["year", "pc11_district_id", "dmsp_f_version"], ascending=[True, True, False])
+    return df.drop_duplicates(subset=["year", "pc11_district_id"], keep="first")
 
 def nightlights_data():
     print(f"✅ Loading Stata file from {nightlights_path_1}")
-    # Read the first nightlights file
-    # Load the datasets
-    df1, _ = pyreadstat.read_dta(nightlights_path_1)  # VIIRS data
-    df2, _ = pyreadstat.read_dta(nightlights_path_2)  # DMSP data
+    # Load the datasets, keeping only "median-masked" VIIRS rows (years up to 2020 include the 2012-2013 overlap)
+    df1 = read_stata_chunks(
+        nightlights_path_1,
+        ["year", "pc11_district_id", "category", "viirs_annual_mean"],
+        lambda chunk: in_years(chunk[chunk["category"] == "median-masked"]),
+    )  # VIIRS data
+    df2 = read_stata_chunks(
+        nightlights_path_2,
+        ["year", "pc11_district_id", "dmsp_f_version", "dmsp_mean_light_cal"],
+        lambda chunk: latest_dmsp_version(in_years(chunk)),
+    )  # DMSP data
 
-    # Filter VIIRS to keep only "median-masked" category
-    df1 = df1[df1["category"] == "median-masked"]
     df1 = df1[["year", "pc11_district_id", "viirs_annual_mean"]].rename(columns={"viirs_annual_mean": "nightlights"})
 
-    # Sort and keep the latest DMSP version
-    df2 = df2.sort_values(["year", "pc11_district_id", "dmsp_f_version"], ascending=[True, True, False])
-    df2 = df2.drop_duplicates(subset=["year", "pc11_district_id"], keep="first")
+    # Keep the latest DMSP version across chunk boundaries
+    df2 = latest_dmsp_version(df2)
     df2 = df2[["year", "pc11_district_id", "dmsp_mean_light_cal"]].rename(columns={"dmsp_mean_light_cal": "nightlights"})
 
     # Identify overlapping years (2012-2013) for intercalibration
@@ -59,62 +116,65 @@ def nightlights_data():
     df_overlap["log_viirs"] = np.log(df_overlap["nightlights_viirs"] + 1e-6)
     df_overlap["log_dmsp"] = np.log(df_overlap["nightlights_dmsp"] + 1e-6)
 
-    # Fit log-linear regression model
-    X = df_overlap["log_dmsp"].values.reshape(-1, 1)
-    y = df_overlap["log_viirs"].values.reshape(-1, 1)
-    model = LinearRegression().fit(X, y)
-
-    alpha, beta = model.intercept_[0], model.coef_[0][0]
+    # State of each district, for per-state fits
+    state_ids = None
+    if nightlights_calibration == "state":
+        state_ids = pd.read_stata(weights_path, columns=["pc11_district_id", "pc11_state_id"]) \
+                      .drop_duplicates("pc11_district_id").set_index("pc11_district_id")["pc11_state_id"]
+
+    # Fit the log-linear model in closed form (pooled, per state, bootstrap intervals)
+    calibration = intercalibrate(
+        df_overlap["log_dmsp"].to_numpy(), df_overlap["log_viirs"].to_numpy(),
+        groups=None if state_ids is None else df_overlap["pc11_district_id"].map(state_ids).to_numpy(),
+        mode=nightlights_calibration, min_group_size=calibration_min_rows, replicates=calibration_replicates,
+    )
+    calibration["overlap_years"] = [2012, 2013]
+    alpha, beta = calibration["pooled"]["alpha"], calibration["pooled"]["beta"]
     print(f"Log-Linear Regression Parameters: α = {alpha:.4f}, β = {beta:.4f}")
+    if "bootstrap" in calibration:
+        (alpha_lo, alpha_hi), (beta_lo, beta_hi) = calibration["bootstrap"]["alpha"], calibration["bootstrap"]["beta"]
+        print(f"    95% bootstrap intervals: α [{alpha_lo:.4f}, {alpha_hi:.4f}], β [{beta_lo:.4f}, {beta_hi:.4f}]")
+    if nightlights_calibration == "state":
+        print(f"    Per-state fits for {len(calibration['groups'])} states, pooled fit for the rest")
 
     # Apply transformation to pre-2012 DMSP data
     df2_pre2012 = df2[df2["year"] < 2012].copy()
-    df2_pre2012["nightlights"] = np.exp(alpha + beta * np.log(df2_pre2012["nightlights"] + 1e-6))
+    df2_pre2012["nightlights"] = np.exp(calibrated_log(
+        calibration, np.log(df2_pre2012["nightlights"] + 1e-6),
+        groups=None if state_ids is None else df2_pre2012["pc11_district_id"].map(state_ids).to_numpy(),
+    ))
 
     # Combine harmonized DMSP and VIIRS data
     nightlights = pd.concat([df1, df2_pre2012])
 
     # Filter for required years
-    nightlights = nightlights[(nightlights["year"] >= 2001) & (nightlights["year"] <= 2020)]
+    nightlights = in_years(nightlights).copy()
     nightlights["log_nightlights"] = np.log1p(nightlights["nightlights"])  # Equivalent to log(1 + x)
 
-
-
+    nightlights.attrs["calibration"] = calibration  # Kept in the stage parquet, then in final_data
     return nightlights
 
 def vcf_data():
     print(f"✅ Loading Stata file from {vcf_path}")
-    # Read the VCF file
-    df, _ = pyreadstat.read_dta(vcf_path)
-    # Select relevant columns and rename them
-    df = df[["year", "pc11_district_id", "vcf_mean"]].rename(columns={"vcf_mean": "forest_cover"})
-
-    # Filter the dataset for the required years
-    df = df[(df["year"] >= 2001) & (df["year"] <= 2020)]
+    # Read the VCF file, filtering the dataset for the required years chunk by chunk
+    df = read_stata_chunks(vcf_path, ["year", "pc11_district_id", "vcf_mean"], in_years)
+    # Rename the relevant columns
+    df = df.rename(columns={"vcf_mean": "forest_cover"})
     df["log_forest_cover"] = np.log1p(df["forest_cover"])  # Equivalent to log(1 + x)
 
-
     return df
 
 def pm25_data():
     print(f"✅ Loading Stata file from {pm25_path}")
-    # Read the PM25 file
-    df, _ = pyreadstat.read_dta(pm25_path)
-    # Select relevant columns
-    df = df[["year", "pc11_district_id", "pm25_mean"]].rename(columns={"pm25_mean": "pm25"})
-
-    # Filter the dataset for the required years
-    df = df[(df["year"] >= 2001) & (df["year"] <= 2020)]
+    # Read the PM25 file, filtering the dataset for the required years chunk by chunk
+    df = read_stata_chunks(pm25_path, ["year", "pc11_district_id", "pm25_mean"], in_years)
+    # Rename the relevant columns
+    df = df.rename(columns={"pm25_mean": "pm25"})
     df["log_pm25"] = np.log1p(df["pm25"])  # Equivalent to log(1 + x)
 
     return df
 
-def merge_and_save_data():
-    # Load all datasets
-    nightlights = nightlights_data()
-    vcf = vcf_data()
-    pm25 = pm25_data()
-
+def boundaries_data():
     # Check if the state GeoPackage file exists
     if not state_path.exists():
         raise FileNotFoundError(f"❌ GeoPackage not found: {state_path}")
@@ -133,6 +193,10 @@ def merge_and_save_data():
     # Filter out invalid district IDs
     district = district[district["pc11_district_id"] != "000"]
 
+    return pd.DataFrame(district)
+
+def weights_data():
+    print(f"✅ Loading Stata file from {weights_path}")
     weights = pd.read_stata(weights_path)
     # Aggregate data at state level
     state_weights = weights.groupby("pc11_state_id", as_index=False).agg({"dist_pc11_pca_tot_p": "sum", "dist_pc11_land_area": "sum"})
@@ -148,11 +212,140 @@ def merge_and_save_data():
     weights = weights[["pc11_district_id", "dist_pc11_pca_tot_p", "dist_pc11_land_area", "area_cat", "pop_cat"]].rename(columns={"dist_pc11_pca_tot_p": "pop11", "dist_pc11_land_area": "area"})
     weights["log_area"] = np.log(weights["area"])
     weights["log_pop11"] = np.log(weights["pop11"])  # Equivalent to log(1 + x)
-    # print(weights.columns)
-
-    
-
 
+    return weights
+
+
+# ✅ Incremental rebuild: each stage's output is cached as parquet, keyed by a hash of
+# its input files and of the code that produces it. Only stale stages are recomputed.
+STAGES = {
+    "nightlights": (nightlights_data, [nightlights_path_1, nightlights_path_2]),  # + weights_path, see stage_inputs
+    "vcf": (vcf_data, [vcf_path]),
+    "pm25": (pm25_data, [pm25_path]),
+    "boundaries": (boundaries_data, [state_path, district_path]),
+    "weights": (weights_data, [weights_path]),
+}
+
+def load_manifest():
+    if manifest_path.exists():
+        return json.loads(manifest_path.read_text())
+    return {"stages": {}, "inputs": {}}
+
+def input_digest(path, manifest):
+    # Re-hash a raw file only when its size or modification time changed
+    stat = path.stat()
+    known = manifest["inputs"].get(str(path))
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["digest"]
+    digest = file_digest(path, length=64)
+    manifest["inputs"][str(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    return digest
+
+# Helpers shared by several stages; their source is part of every stage key
+SHARED_CODE = [read_stata_chunks, in_years, latest_dmsp_version]
+
+# Helpers and settings of a single stage, part of that stage's key only
+STAGE_CODE = {"nightlights": [fit, fit_groups, bootstrap_fit, intercalibrate, calibrated_log]}
+
+def stage_settings(name):
+    if name == "nightlights":
+        return {"calibration": nightlights_calibration, "min_rows": calibration_min_rows, "replicates": calibration_replicates}
+    return {}
+
+# Command line settings as one dict; worker processes started with spawn or forkserver
+# re-import this module with the defaults, so the pool applies them in every worker
+def pipeline_settings():
+    return {"stata_chunksize": stata_chunksize, "nightlights_calibration": nightlights_calibration,
+            "calibration_min_rows": calibration_min_rows, "calibration_replicates": calibration_replicates}
+
+def apply_settings(settings):
+    globals().update(settings)
+
+def stage_inputs(name):
+    # Files a stage reads with the current settings; the weights file only maps districts
+    # to states for per-state calibration
+    inputs = list(STAGES[name][1])
+    if name == "nightlights" and nightlights_calibration == "state":
+        inputs.append(weights_path)
+    return inputs
+
+def stage_key(name, manifest):
+    func, inputs = STAGES[name][0], stage_inputs(name)
+    key = hashlib.sha256(inspect.getsource(func).encode("utf-8"))
+    for helper in SHARED_CODE + STAGE_CODE.get(name, []):
+        key.update(inspect.getsource(helper).encode("utf-8"))
+    key.update(json.dumps(stage_settings(name), sort_keys=True).encode("utf-8"))
+    for path in inputs:
+        key.update(f"{path.name}:{input_digest(path, manifest)}".encode("utf-8"))
+    return key.hexdigest()[:16]
+
+def compute_stage(name, output_path):
+    # Runs in a worker process in parallel mode; the stage writes its own output so
+    # only the row count and timing travel back to the parent process
+    start = time.perf_counter()
+    result = STAGES[name][0]()
+    result.to_parquet(output_path, engine="pyarrow", index=False)
+    return len(result), time.perf_counter() - start
+
+def print_timings(timings, wall_seconds):
+    print("⏱️  Stage timings:")
+    for name, (status, seconds) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        print(f"    {name:<12} {status:<7} {seconds:8.2f} s")
+    built = [seconds for status, seconds in timings.values() if status == "built"]
+    merge_seconds = timings.get("merge+save", ("merge", 0.0))[1]
+    critical_path = max(built, default=0.0) + merge_seconds  # Slowest stage, then the merge
+    print(f"    critical path {critical_path:.2f} s, sum of built stages {sum(built):.2f} s, wall {wall_seconds:.2f} s")
+
+def merge_and_save_data(force=(), workers=1):
+    # force: stage names to rebuild even if cached, or True for all of them
+    # workers: processes used to build stale stages concurrently (1 = sequential)
+    wall_start = time.perf_counter()
+    stage_cache_folder.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest()
+    forced = set(STAGES) if force is True else set(force)
+
+    keys = {name: stage_key(name, manifest) for name in STAGES}
+    paths = {name: stage_cache_folder / f"{name}-{keys[name]}.parquet" for name in STAGES}
+    stale = [name for name in STAGES if name in forced or not paths[name].exists()]
+
+    # Build stale stages, concurrently when asked to (they are independent and I/O / decode bound)
+    if workers > 1 and len(stale) > 1:
+        print(f"🚀 Building {len(stale)} stages on {min(workers, len(stale))} worker processes")
+        with ProcessPoolExecutor(max_workers=min(workers, len(stale)), initializer=apply_settings,
+                                 initargs=(pipeline_settings(),)) as pool:
+            futures = {name: pool.submit(compute_stage, name, paths[name]) for name in stale}
+            built = {name: future.result() for name, future in futures.items()}
+    else:
+        built = {name: compute_stage(name, paths[name]) for name in stale}
+
+    timings = {}
+    for name, (rows, seconds) in built.items():
+        timings[name] = ("built", seconds)
+        # Drop this stage's outputs for older input/code versions
+        for old_path in stage_cache_folder.glob(f"{name}-*.parquet"):
+            if old_path != paths[name]:
+                old_path.unlink()
+        manifest["stages"][name] = {
+            "key": keys[name],
+            "output": paths[name].name,
+            "rows": rows,
+            "inputs": [str(path) for path in stage_inputs(name)],
+            "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+
+    # Load all datasets from the stage cache
+    results = {}
+    for name in STAGES:
+        start = time.perf_counter()
+        results[name] = pd.read_parquet(paths[name])
+        if name not in built:
+            print(f"⏭️  Stage {name} is up to date ({paths[name].name})")
+            timings[name] = ("cached", time.perf_counter() - start)
+
+    merge_start = time.perf_counter()
+    nightlights, vcf, pm25 = results["nightlights"], results["vcf"], results["pm25"]
+    district, weights = results["boundaries"], results["weights"]
 
     # Merge all datasets
     final_dataset = (district
@@ -164,11 +357,110 @@ def merge_and_save_data():
     # Convert the 'year' column to integer
     final_dataset["year"] = final_dataset["year"].astype(int)
 
+    # Merges drop attrs; keep the intercalibration with the data (read back by write_outputs)
+    final_dataset.attrs["nightlights_calibration"] = nightlights.attrs.get("calibration")
+
     print(f"💾 Saving data to {data_parquet_path}")
     
     # Save the final dataset to a Parquet file
     final_dataset.to_parquet(data_parquet_path, engine="pyarrow")
+    write_outputs()
+    timings["merge+save"] = ("merge", time.perf_counter() - merge_start)
+
+    geometry_start = time.perf_counter()
+    status = "built" if write_geometry(manifest, force="boundaries" in forced) else "cached"
+    timings["geometry"] = (status, time.perf_counter() - geometry_start)
+
+    print_timings(timings, time.perf_counter() - wall_start)
+
+# ✅ Outputs derived from final_data.parquet (rebuildable without the raw files).
+# Arrow-native so large inputs fit in memory: one sorted copy of the table and no pandas round trips.
+def write_outputs():
+    table = pq.read_table(data_parquet_path)
+    table = table.sort_by([(col, "ascending") for col in SORT_COLUMNS])  # DistrictIndex order (stable)
+
+    print(f"💾 Writing year-partitioned dataset to {dataset_path}")
+    write_partitioned(table, dataset_path, row_group_size=dataset_row_group_size, presorted=True)
+
+    # Same order as DistrictIndex, so mapped frames need no per-worker sort
+    print(f"💾 Writing memory-mappable Arrow file to {arrow_path}")
+    write_arrow(table, arrow_path)
+
+    # Districts repeat every year, so one year of the dimension columns describes them all
+    years = sorted(pc.unique(table["year"]).to_pylist())
+    dimensions = table.select(DIMENSION_COLUMNS + ["year"]).filter(pc.equal(table["year"], years[0])).to_pandas()
+    fields = table.schema
+    data_version = file_digest(data_parquet_path)
+    attributes = (fields.pandas_metadata or {}).get("attributes", {})  # DataFrame.attrs saved by merge_and_save_data
+    print(f"💾 Writing metadata sidecar to {metadata_path}")
+    metadata = build_metadata(
+        DistrictIndex(dimensions, presorted=True),
+        columns=fields.names,
+        numeric_columns=[f.name for f in fields if pa.types.is_integer(f.type) or pa.types.is_floating(f.type)],
+        years=years,
+        data_version=data_version,
+        nightlights_calibration=attributes.get("nightlights_calibration"),
+    )
+    write_metadata(metadata, metadata_path, data_parquet_path)
+
+    print(f"💾 Writing weighted state/area_cat/pop_cat cubes to {cubes_path}")
+    write_cubes(table, cubes_path, data_version)
+
+
+# ✅ Map tab geometries: the district polygons simplified at each GEOMETRY_LEVELS tolerance and
+# written as quantized TopoJSON. Rebuilt only when the boundary files, the levels or the encoder change.
+def write_geometry(manifest, force=False):
+    # The boundary files' digests come from the manifest (re-hashed only when size or mtime changed)
+    version = hashlib.sha256(json.dumps(GEOMETRY_LEVELS).encode("utf-8"))
+    version.update(inspect.getsource(inspect.getmodule(write_topologies)).encode("utf-8"))
+    for path in [state_path, district_path]:
+        version.update(input_digest(path, manifest).encode("utf-8"))
+    version = version.hexdigest()[:16]
+    if not force and (read_geometry_index(geometry_path) or {}).get("version") == version:
+        print(f"⏭️  Map geometries are up to date ({geometry_path})")
+        return False
+
+    state = gpd.read_file(state_path)
+    district = gpd.read_file(district_path)
+    district = district.merge(state[["pc11_state_id", "state_name"]], on="pc11_state_id", how="left")
+    district = district[district["pc11_district_id"] != "000"].rename(columns={"district_name": "district", "state_name": "state"})
+    if district.crs is not None and not district.crs.equals("EPSG:4326"):
+        district = district.to_crs("EPSG:4326")  # Tolerances are in degrees
+    district = district.sort_values(["state", "district"], kind="stable")
+
+    print(f"💾 Writing simplified district geometries to {geometry_path}")
+    write_topologies(
+        district.geometry.to_numpy(),
+        ids=district["pc11_district_id"].tolist(),
+        properties=[{"state": s, "district": d} for s, d in zip(district["state"], district["district"])],
+        folder=geometry_path,
+        version=version,
+    )
+    return True
+
 
 if __name__ == "__main__":
-    merge_and_save_data()
-    print("🎉 All conversions and saves completed successfully!")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Merge the raw SHRUG files into data/clean/final_data.parquet.")
+    parser.add_argument("--force", nargs="*", choices=list(STAGES), metavar="STAGE",
+                        help="Rebuild stages even if cached; with no names, rebuild all of them.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for building stale stages in parallel (0 = one per stage).")
+    parser.add_argument("--chunksize", type=int, default=stata_chunksize,
+                        help="Rows per chunk when streaming the Stata files.")
+    parser.add_argument("--calibration", choices=["pooled", "state"], default=nightlights_calibration,
+                        help="DMSP -> VIIRS nightlights intercalibration: one pooled fit or one fit per state.")
+    parser.add_argument("--bootstrap", type=int, default=calibration_replicates,
+                        help="Bootstrap replicates for the calibration confidence intervals (0 = none).")
+    parser.add_argument("--outputs-only", action="store_true",
+                        help="Only rewrite the derived outputs from the existing final_data.parquet.")
+    args = parser.parse_args()
+    apply_settings({"stata_chunksize": args.chunksize, "nightlights_calibration": args.calibration,
+                    "calibration_replicates": args.bootstrap})
+
+    if args.outputs_only:
+        write_outputs()
+        sys.exit(0)
+
+    merge_and_save_data(force=True if args.force == [] else (args.force or ()),
+                        workers=args.workers or len(STAGES))
+    print("🎉 All conversions and saves completed successfully!")
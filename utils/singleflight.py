@@ -0,0 +1,98 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from utils.metrics import record_cache
+
+
+# ✅ Single-flight coalescing: concurrent calls with the same key share one computation.
+# The first caller (the leader) runs it; callers arriving while it runs wait for its result
+# (or its exception) instead of computing the same thing again. Nothing is kept afterwards,
+# so this complements the caches rather than replacing them. Per worker process: threads of
+# a gthread worker coalesce, separate workers don't.
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset)
+        self.stats = {}
+
+    def _reset(self):
+        # Flights of the parent's threads never finish in a forked child
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def _counters(self, name):
+        return self.stats.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0,
+                                            "saved_s": 0.0, "waited_s": 0.0, "max_waiters": 0})
+
+    def do(self, name, key, func):
+        with self._lock:
+            counters = self._counters(name)
+            counters["calls"] += 1
+            flight = self._flights.get((name, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(name, key)] = _Flight()
+            else:
+                flight.waiters += 1
+                counters["max_waiters"] = max(counters["max_waiters"], flight.waiters)
+        record_cache("singleflight", not leader)
+
+        if not leader:
+            started = time.perf_counter()
+            flight.done.wait()
+            with self._lock:
+                counters["coalesced"] += 1
+                counters["waited_s"] += time.perf_counter() - started
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        started = time.perf_counter()
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                del self._flights[(name, key)]
+                counters["executions"] += 1
+                counters["errors"] += flight.error is not None
+                counters["saved_s"] += seconds * flight.waiters  # What each waiter would have spent
+            flight.done.set()
+
+    def coalesce(self, name, key=None):
+        # Decorator; key(*args, **kwargs) normalizes the inputs, by default their canonical JSON
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                flight_key = key(*args, **kwargs) if key else json.dumps([args, kwargs], sort_keys=True, default=str)
+                return self.do(name, flight_key, lambda: func(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    def info(self):
+        with self._lock:
+            stats = {name: dict(counters) for name, counters in self.stats.items()}
+            in_flight = len(self._flights)
+        return {"callbacks": stats, "in_flight": in_flight,
+                "coalesced": sum(c["coalesced"] for c in stats.values()),
+                "saved_s": round(sum(c["saved_s"] for c in stats.values()), 3)}
+
+
+singleflight = SingleFlight()
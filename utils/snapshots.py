@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from utils.datastore import read_arrow
+from utils.metrics import record_cache
+
+
+# ✅ Pre-serialized table snapshots.
+# The sorted, rounded table is deterministic for a given parquet file and log toggle,
+# so it is built once, encoded once and persisted to disk. Other gunicorn workers pick
+# the files up instead of rebuilding, and the bytes are served with a strong ETag.
+
+Snapshot = namedtuple("Snapshot", ["etag", "body"])
+
+
+def file_digest(path, length=16):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def _atomic_write(path, write):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class TableSnapshots:
+    def __init__(self, build_frame, version, folder, decimals=10):
+        self.build_frame = build_frame  # log_enabled -> sorted, rounded DataFrame
+        self.version = version
+        self.decimals = decimals  # Also hides float32 noise in compact frames
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._prune()
+        self._snapshots = {}
+        self._frames = {}
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset_lock)  # Safe with gunicorn preload_app
+        # Per layer: the table frame (row blocks) and the encoded JSON body (clientSide grid)
+        self.stats = {"frame_memory_hits": 0, "frame_disk_hits": 0, "frame_misses": 0,
+                      "body_memory_hits": 0, "body_disk_hits": 0, "body_misses": 0, "not_modified": 0}
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def variant(self, log_enabled):
+        return "log" if log_enabled else "plain"
+
+    def etag(self, log_enabled):
+        return f"{self.version}-{self.variant(log_enabled)}"
+
+    def _paths(self, log_enabled):
+        stem = f"table-{self.etag(log_enabled)}"
+        return self.folder / f"{stem}.json", self.folder / f"{stem}.arrow"
+
+    def _prune(self):
+        # Drop snapshots left behind by older versions of the parquet file
+        for path in self.folder.glob("table-*"):
+            if not path.name.startswith(f"table-{self.version}-"):
+                path.unlink(missing_ok=True)
+
+    def _load_frame(self, log_enabled):
+        # Memory first, then the Arrow file written by another worker, then build
+        record_cache("table_frame", log_enabled in self._frames)
+        if log_enabled in self._frames:
+            self.stats["frame_memory_hits"] += 1
+            return self._frames[log_enabled]
+
+        frame_path = self._paths(log_enabled)[1]
+        if frame_path.exists():
+            self.stats["frame_disk_hits"] += 1
+        else:
+            self.stats["frame_misses"] += 1
+            frame = self.build_frame(log_enabled).reset_index(drop=True)
+            _atomic_write(frame_path, lambda p: frame.to_feather(p, compression="uncompressed"))
+        self._frames[log_enabled] = read_arrow(frame_path)  # Memory-mapped, shared across workers
+        return self._frames[log_enabled]
+
+    def _load_body(self, log_enabled):
+        # The JSON body is only encoded when it is served (clientSide grid), not for row blocks
+        record_cache("table_snapshot", log_enabled in self._snapshots)
+        if log_enabled in self._snapshots:
+            self.stats["body_memory_hits"] += 1
+            return self._snapshots[log_enabled]
+
+        json_path = self._paths(log_enabled)[0]
+        if json_path.exists():
+            self.stats["body_disk_hits"] += 1
+            body = json_path.read_bytes()
+        else:
+            self.stats["body_misses"] += 1
+            frame = self._load_frame(log_enabled)
+            body = frame.to_json(orient="records", double_precision=self.decimals).encode("utf-8")
+            _atomic_write(json_path, lambda p: p.write_bytes(body))
+            print(f"📸 Built table snapshot {json_path.name} ({len(body) / 1e6:.1f} MB)")
+        self._snapshots[log_enabled] = Snapshot(self.etag(log_enabled), body)
+        return self._snapshots[log_enabled]
+
+    def get(self, log_enabled):
+        with self._lock:
+            return self._load_body(log_enabled)
+
+    def frame(self, log_enabled):
+        with self._lock:
+            return self._load_frame(log_enabled)
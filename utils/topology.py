@@ -0,0 +1,211 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+# Add the parent directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+
+# ✅ District geometries for the map tab, written by prep_data.py as TopoJSON at several
+# resolutions. Each level is simplified as a coverage (neighbouring districts keep one shared
+# border, so no gaps open up), quantized to an integer grid and split into arcs that
+# neighbours share, stored once and delta-encoded. assets/map.js decodes it in the browser.
+
+# Level -> (simplification tolerance in degrees, quantization grid size)
+GEOMETRY_LEVELS = {
+    "low": (0.05, 10_000),
+    "medium": (0.01, 100_000),
+    "high": (0.002, 100_000),
+}
+
+
+def simplify_coverage(geometries, tolerance):
+    # Snapping to a 1e-6° grid (~0.1 m) first merges border vertices that neighbours only
+    # share up to floating point noise
+    geometries = shapely.set_precision(geometries, 1e-6)
+    simplified = shapely.coverage_simplify(geometries, tolerance)
+    # Districts that collapse (an invalid input coverage) keep an individually simplified shape
+    broken = shapely.is_empty(simplified) | ~shapely.is_valid(simplified)
+    simplified[broken] = shapely.simplify(geometries[broken], tolerance, preserve_topology=True)
+    return shapely.orient_polygons(simplified)  # Counter-clockwise exteriors (RFC 7946)
+
+
+def _polygons(geometry):
+    # Polygon / MultiPolygon -> [[exterior, hole, ...], ...] as coordinate arrays
+    if geometry is None or geometry.is_empty:
+        return []
+    parts = geometry.geoms if geometry.geom_type == "MultiPolygon" else [geometry]
+    return [[np.asarray(p.exterior.coords)] + [np.asarray(r.coords) for r in p.interiors] for p in parts]
+
+
+def _quantize(coords, translate, scale):
+    # Integer grid points without consecutive duplicates; closed rings stay closed
+    points = np.round((coords[:, :2] - translate) / scale).astype(np.int64)
+    keep = np.concatenate(([True], np.any(points[1:] != points[:-1], axis=1)))
+    return [tuple(p) for p in points[keep].tolist()]
+
+
+def _junctions(rings):
+    # Points where rings meet or part: the same point seen with different neighbours
+    neighbours, junctions = {}, set()
+    for ring in rings:
+        n = len(ring) - 1  # The closing point repeats the first
+        for i in range(n):
+            pair = tuple(sorted((ring[i - 1] if i else ring[-2], ring[i + 1])))
+            if neighbours.setdefault(ring[i], pair) != pair:
+                junctions.add(ring[i])
+    return junctions
+
+
+class _Arcs:
+    def __init__(self):
+        self.arcs = []
+        self.index = {}
+
+    def add(self, points):
+        # Arc index, or ~index when the arc is stored in the opposite direction
+        key = tuple(points)
+        if key in self.index:
+            return self.index[key]
+        reverse = key[::-1]
+        if reverse in self.index:
+            return ~self.index[reverse]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(points)
+        return self.index[key]
+
+
+def _ring_arcs(ring, junctions, arcs):
+    cuts = [i for i, point in enumerate(ring[:-1]) if point in junctions]
+    if not cuts:
+        # Ring without junctions (an island or enclave): one closed arc starting at its smallest point
+        start = min(range(len(ring) - 1), key=ring.__getitem__)
+        return [arcs.add(ring[start:-1] + ring[:start + 1])]  # An enclave's border is stored once
+    rotated = ring[cuts[0]:-1] + ring[:cuts[0] + 1]
+    cuts = [i - cuts[0] for i in cuts] + [len(rotated) - 1]
+    return [arcs.add(rotated[a:b + 1]) for a, b in zip(cuts[:-1], cuts[1:])]
+
+
+def _encode_arc(points):
+    points = np.asarray(points, dtype=np.int64)
+    return np.concatenate([points[:1], np.diff(points, axis=0)]).tolist()
+
+
+def build_topology(geometries, properties, quantization, object_name="districts"):
+    x0, y0, x1, y1 = shapely.total_bounds(geometries)
+    translate = np.array([x0, y0])
+    scale = np.array([max(x1 - x0, 1e-12), max(y1 - y0, 1e-12)]) / (quantization - 1)
+
+    polygons = []
+    for geometry in geometries:
+        parts = []
+        for rings in _polygons(geometry):
+            rings = [_quantize(r, translate, scale) for r in rings]
+            rings = [r for r in rings if len(r) >= 4]  # Rings that collapsed onto the grid are dropped
+            if rings and len(rings[0]) >= 4 and rings[0][0] == rings[0][-1]:
+                parts.append(rings)
+        polygons.append(parts)
+
+    junctions = _junctions([ring for parts in polygons for rings in parts for ring in rings])
+    arcs = _Arcs()
+    objects = []
+    for i, (parts, props) in enumerate(zip(polygons, properties)):
+        encoded = [[_ring_arcs(ring, junctions, arcs) for ring in rings] for rings in parts]
+        if not encoded:
+            objects.append({"type": None, "id": i, "properties": props})
+        elif len(encoded) == 1:
+            objects.append({"type": "Polygon", "arcs": encoded[0], "id": i, "properties": props})
+        else:
+            objects.append({"type": "MultiPolygon", "arcs": encoded, "id": i, "properties": props})
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": scale.tolist(), "translate": translate.tolist()},
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": objects}},
+        "arcs": [_encode_arc(a) for a in arcs.arcs],
+    }
+
+
+def decode_topology(topology, object_name="districts"):
+    # Same decoding as assets/map.js: a list of (geometry type, coordinates) per object
+    scale = np.array(topology["transform"]["scale"])
+    translate = np.array(topology["transform"]["translate"])
+    arcs = [np.cumsum(np.asarray(a, dtype=np.int64), axis=0) * scale + translate for a in topology["arcs"]]
+
+    def ring(indexes):
+        points = []
+        for i in indexes:
+            arc = arcs[i] if i >= 0 else arcs[~i][::-1]
+            points.extend(arc.tolist()[1:] if points else arc.tolist())
+        return points
+
+    decoded = []
+    for obj in topology["objects"][object_name]["geometries"]:
+        if obj["type"] == "Polygon":
+            decoded.append(("Polygon", [ring(r) for r in obj["arcs"]]))
+        elif obj["type"] == "MultiPolygon":
+            decoded.append(("MultiPolygon", [[ring(r) for r in p] for p in obj["arcs"]]))
+        else:
+            decoded.append((None, []))
+    return decoded
+
+
+def write_topologies(geometries, ids, properties, folder, version, levels=GEOMETRY_LEVELS):
+    # districts-<level>.topo.json per level plus index.json (geometry order, levels, version)
+    folder.mkdir(parents=True, exist_ok=True)
+    geometries = np.asarray(geometries, dtype=object)
+    index = {"version": version, "ids": [str(i) for i in ids], "levels": {}}
+    for level, (tolerance, quantization) in levels.items():
+        topology = build_topology(simplify_coverage(geometries, tolerance), properties, quantization)
+        path = folder / f"districts-{level}.topo.json"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(topology, separators=(",", ":"), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+        index["levels"][level] = {"tolerance": tolerance, "quantization": quantization,
+                                  "arcs": len(topology["arcs"]), "bytes": path.stat().st_size}
+        print(f"    {level:<7} tolerance {tolerance:<6} {len(topology['arcs']):>7,} arcs {path.stat().st_size / 1e3:>9.1f} KB")
+    (folder / "index.json").write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    return index
+
+
+def read_geometry_index(folder):
+    try:
+        return json.loads((folder / "index.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# ✅ Round trip check: every decoded district matches its simplified shape within the
+# quantization step; run as `python utils/topology.py [district.gpkg]` (a synthetic grid
+# of Voronoi cells without an argument)
+def check_round_trip(geometries, levels=GEOMETRY_LEVELS):
+    geometries = np.asarray(geometries, dtype=object)
+    for level, (tolerance, quantization) in levels.items():
+        simplified = simplify_coverage(geometries, tolerance)
+        topology = build_topology(simplified, [{} for _ in simplified], quantization)
+        step = max(topology["transform"]["scale"])
+        for original, (kind, coords) in zip(simplified, decode_topology(topology)):
+            if kind is None:
+                continue
+            decoded = shapely.geometry.shape({"type": kind, "coordinates": coords})
+            assert shapely.hausdorff_distance(original, decoded) <= 2 * step, level
+        raw = sum(len(shapely.get_coordinates(g)) for g in simplified)
+        stored = sum(len(a) for a in topology["arcs"])
+        print(f"✅ {level}: {len(simplified)} districts decoded within {step:.5f}°, {stored:,} stored points for {raw:,} ring points")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        import geopandas as gpd
+        shapes = gpd.read_file(sys.argv[1]).geometry.to_numpy()
+    else:
+        rng = np.random.default_rng(0)
+        points = shapely.multipoints(rng.uniform([68, 8], [97, 37], size=(640, 2)))
+        cells = shapely.get_parts(shapely.voronoi_polygons(points, extend_to=shapely.box(68, 8, 97, 37)))
+        shapes = shapely.intersection(cells, shapely.box(68, 8, 97, 37).buffer(-0.5).buffer(0.5, quad_segs=64))
+        shapes = shapely.segmentize(shapes, 0.01)  # Dense borders, like surveyed boundaries
+    check_round_trip(shapes)